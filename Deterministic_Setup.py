@@ -1,169 +1,212 @@
-import os
+import re
 import json
-from transformers import pipeline, AutoModelForCausalLM, AutoTokenizer
-import torch
+import math
+from functools import lru_cache
 
-from google import genai
-from google.genai.types import HttpOptions
+import llm_gateway
+from repo_scan import scan_repository
+from ingest import iter_lines, DEFAULT_MAX_FILE_BYTES
+
+# ---------- rule tables ----------
+# Detection is data-driven: add a row here, not another elif. Every table is either a
+# dict lookup or folded into one compiled regex, so a scan costs one pass per file no
+# matter how many rules there are.
+
+EXTENSION_LANGUAGES = {
+    ".cpp": "C/C++", ".cs": "C#", ".css": "CSS", ".dart": "Dart", ".fs": "F#", ".go": "Go",
+    ".html": "HTML", ".java": "Java", ".js": "JavaScript", ".json": "JSON", ".jl": "Julia",
+    ".less": "Less", ".md": "Markdown", ".php": "PHP", ".ps1": "PowerShell", ".py": "Python",
+    ".r": "R", ".rb": "Ruby", ".rs": "Rust", ".scss": "SCSS", ".swift": "Swift",
+    ".ts": "TypeScript", ".sql": "T-SQL",
+}
+
+# file name -> language, and for dependency manifests the parser that reads them
+MANIFEST_FILES = {
+    "requirements.txt": ("Python", "requirements"),
+    "package.json": ("JavaScript", "package_json"),
+    "Cargo.toml": ("Rust", None),
+    "go.mod": ("Go", None),
+    "Dockerfile": ("Dockerfile", None),
+}
+MANIFEST_SUFFIXES = {".csproj": "C#"}
+
+# build tool -> repo-relative paths; a trailing "/" matches anything under that directory
+BUILD_TOOL_FILES = {
+    "Docker": ["docker-compose.yml", "docker-compose.yaml", "compose.yaml"],
+    "Make": ["Makefile"],
+    "Vagrant": ["Vagrantfile"],
+    "Kubernetes": ["k8s.yaml", "deployment.yaml"],
+    "Terraform": ["main.tf"],
+    "CircleCI": [".circleci/config.yml"],
+    "GitHub Actions": [".github/workflows/"],
+    "Jenkins": ["Jenkinsfile"],
+}
+
+# top-level package / module name -> (tech_stack category, label); shared by the dependency
+# manifests and the import scan so both report the same names
+PYTHON_PACKAGES = {
+    "django": ("frameworks", "Django"),
+    "flask": ("frameworks", "Flask"),
+    "fastapi": ("frameworks", "FastAPI"),
+    "pyramid": ("frameworks", "Pyramid"),
+    "torch": ("frameworks", "PyTorch"),
+    "tensorflow": ("frameworks", "TensorFlow"),
+    "psycopg2": ("databases", "PostgreSQL"),
+    "psycopg2-binary": ("databases", "PostgreSQL"),
+    "sqlalchemy": ("databases", "SQLAlchemy"),
+}
+JS_PACKAGES = {
+    "react": ("frameworks", "React"),
+    "react-dom": ("frameworks", "React"),
+    "react-native": ("frameworks", "React"),
+    "vue": ("frameworks", "Vue.js"),
+    "angular": ("frameworks", "Angular"),
+    "@angular": ("frameworks", "Angular"),
+    "express": ("frameworks", "Express.js"),
+    "koa": ("frameworks", "Koa"),
+    "next": ("frameworks", "Next.js"),
+    "nuxt": ("frameworks", "Nuxt.js"),
+    "mongoose": ("databases", "MongoDB"),
+    "sequelize": ("databases", "SQL"),
+}
+
+_BUILD_FILE_INDEX = {path: tool for tool, paths in BUILD_TOOL_FILES.items() for path in paths if not path.endswith("/")}
+_BUILD_DIR_RULES = [(path, tool) for tool, paths in BUILD_TOOL_FILES.items() for path in paths if path.endswith("/")]
+_BUILD_DIR_RE = re.compile("|".join(f"(?P<d{i}>{re.escape(path)})" for i, (path, _) in enumerate(_BUILD_DIR_RULES))) \
+    if _BUILD_DIR_RULES else None
+
+# One regex per language pulls the module name out of an import line; the package tables
+# above are then a dict lookup. Lines are only read up to the end of the import header.
+_PY_IMPORT_RE = re.compile(r"^\s*(?:from\s+([\w.]+)\s+import\b|import\s+([\w., \t]+))")
+_PY_BODY_START_RE = re.compile(r"^(?:async\s+def|def|class)\b|^@|^if\s+__name__\b")
+_JS_IMPORT_RE = re.compile(r"""(?:\bfrom\s*|\bimport\s*\(?\s*|\brequire\s*\(\s*)["']([^"']+)["']""")
+_JS_BODY_START_RE = re.compile(r"^(?:export\s+(?:default\s+)?)?(?:async\s+)?(?:function|class)\b|^export\s+default\b")
+
+IMPORT_SCAN_EXTENSIONS = {".py": "python", ".js": "js", ".jsx": "js", ".mjs": "js", ".cjs": "js", ".ts": "js", ".tsx": "js"}
+
+# ---------- detection ----------
+
+def detect_tech_stack(repo_path, manifest=None):
+    if manifest is None:
+        manifest = scan_repository(repo_path)
 
-def detect_tech_stack(repo_path):
     tech_stack = {
         "languages": set(),
         "frameworks": set(),
         "build_tools": set(),
         "databases": set(),
     }
-    
-    filetypes = {'.cpp': 'C/C++',
-                 '.cs': 'C#',
-                 '.css': 'CSS',
-                 '.dart': 'Dart',
-                 'Dockerfile': 'Dockerfile',
-                 '.fs': 'F#',
-                 '.go': 'Go',
-                 '.html': 'HTML',
-                 '.java': 'Java',
-                 '.js': 'JavaScript',
-                 '.json': 'JSON',
-                 '.jl': 'Julia',
-                 '.less': 'Less',
-                 '.md': 'Markdown',
-                 '.php': 'PHP',
-                 '.ps1': 'PowerShell',
-                 '.py': 'Python',
-                 '.r': 'R',
-                 '.rb': 'Ruby',
-                 '.rs': 'Rust',
-                 '.scss': 'SCSS',
-                 '.swift': 'Swift',
-                 '.ts': 'TypeScript',
-                 '.sql': 'T-SQL'
-                 }
-    
-    frameworks_to_files = {"Docker": "docker-compose.yml",
-                           "Make": "Makefile",
-                           "Vagrant": "Vagrantfile",
-                           "Kubernetes": ["k8s.yaml", "deployment.yaml"],
-                           "Terraform": "main.tf",
-                           "CircleCI": ".circleci/config.yml",
-                           "GitHub Actions": ".github/workflows/",
-                           "Jenkins": "Jenkinsfile"
-                           }
-    
-    for tool, filenames in frameworks_to_files.items():
-        if isinstance(filenames, list):
-            if any(file == f for f in filenames for file in os.listdir(repo_path)):
-                tech_stack["build_tools"].add(tool)
-
-    for root, _, files in os.walk(repo_path):
-        for file in files:
-            file_path = os.path.join(root, file)
-            
-            _, ext = os.path.splitext(file)
-            if ext in filetypes:
-                tech_stack["languages"].add(filetypes[ext])
-            elif file == "requirements.txt":
-                tech_stack["languages"].add("Python")
-                _parse_requirements(file_path, tech_stack)
-            elif file == "package.json":
-                tech_stack["languages"].add("JavaScript")
-                _parse_package_json(file_path, tech_stack)
-            elif file == "Cargo.toml":
-                tech_stack["languages"].add("Rust")
-            elif file == "go.mod":
-                tech_stack["languages"].add("Go")
-            elif file.endswith(".csproj"):
-                tech_stack["languages"].add("C#")
-    
-    _detect_frameworks_from_imports(repo_path, tech_stack)
-    
+
+    for entry in manifest:
+        file = entry["name"]
+        rel = entry["rel"]
+
+        tool = _BUILD_FILE_INDEX.get(rel)
+        if tool:
+            tech_stack["build_tools"].add(tool)
+        elif _BUILD_DIR_RE is not None:
+            m = _BUILD_DIR_RE.match(rel)
+            if m:
+                tech_stack["build_tools"].add(_BUILD_DIR_RULES[int(m.lastgroup[1:])][1])
+
+        ext = entry["ext"]
+        # not elif: package.json is both a manifest and a ".json" file
+        if file in MANIFEST_FILES:
+            language, parser = MANIFEST_FILES[file]
+            tech_stack["languages"].add(language)
+            if parser == "requirements":
+                _parse_requirements(entry["path"], tech_stack)
+            elif parser == "package_json":
+                _parse_package_json(entry["path"], tech_stack)
+        if ext in EXTENSION_LANGUAGES:
+            tech_stack["languages"].add(EXTENSION_LANGUAGES[ext])
+        elif ext in MANIFEST_SUFFIXES:
+            tech_stack["languages"].add(MANIFEST_SUFFIXES[ext])
+
+    _detect_frameworks_from_imports(manifest, tech_stack)
+
     return tech_stack
 
+def _add_package(table, pkg, tech_stack):
+    rule = table.get(pkg)
+    if rule:
+        tech_stack[rule[0]].add(rule[1])
+
+_REQUIREMENT_NAME_RE = re.compile(r"^\s*([A-Za-z0-9][A-Za-z0-9._-]*)")
+
 def _parse_requirements(file_path, tech_stack):
-    try:
-        with open(file_path, "r") as f:
-            for line in f:
-                line = line.strip()
-                if line.startswith("#") or not line:
-                    continue
-                # Extract package name (ignore versions)
-                pkg = line.split("==")[0].split(">")[0].split("<")[0]
-                
-                # Map packages to frameworks
-                if pkg in ["django", "flask", "fastapi"]:
-                    tech_stack["frameworks"].add(pkg.capitalize())
-                elif pkg in ["torch", "tensorflow"]:
-                    tech_stack["frameworks"].add("PyTorch" if pkg == "torch" else "TensorFlow")
-                elif pkg in ["psycopg2", "sqlalchemy"]:
-                    tech_stack["databases"].add("PostgreSQL" if pkg == "psycopg2" else "SQLAlchemy")
-    except FileNotFoundError:
-        pass
+    for line in iter_lines(file_path):
+        if line.lstrip().startswith(("#", "-")):
+            continue   # comments and pip options (-r, -e, --index-url)
+        m = _REQUIREMENT_NAME_RE.match(line)
+        if m:
+            # Extract package name (ignore versions, extras and markers)
+            _add_package(PYTHON_PACKAGES, m.group(1).lower(), tech_stack)
 
 def _parse_package_json(file_path, tech_stack):
     try:
         with open(file_path, "r") as f:
             data = json.load(f)
-            deps = data.get("dependencies", {}) | data.get("devDependencies", {})
-            
+    except (OSError, json.JSONDecodeError, UnicodeDecodeError):
+        return
+    if not isinstance(data, dict):
+        return
+    for section in ("dependencies", "devDependencies", "peerDependencies"):
+        deps = data.get(section)
+        if isinstance(deps, dict):
             for pkg in deps:
-                if pkg in ["react", "vue", "angular"]:
-                    tech_stack["frameworks"].add(pkg.capitalize())
-                elif pkg in ["express", "koa"]:
-                    tech_stack["frameworks"].add("Express.js" if pkg == "express" else "Koa")
-                elif pkg in ["mongoose", "sequelize"]:
-                    tech_stack["databases"].add("MongoDB" if pkg == "mongoose" else "SQL")
-    except (FileNotFoundError, json.JSONDecodeError):
-        pass
-
-def _detect_frameworks_from_imports(repo_path, tech_stack):
+                _add_package(JS_PACKAGES, _js_package_root(pkg), tech_stack)
+
+def _js_package_root(spec):
+    # "react-dom/client" -> "react-dom", "@angular/core" -> "@angular"; relative paths stay as-is
+    return spec.split("/", 1)[0]
+
+def _detect_frameworks_from_imports(manifest, tech_stack):
     # Only run if language is Python/JS (for brevity)
     if ("Python" not in tech_stack["languages"]) and ("JavaScript" not in tech_stack["languages"]):
         return
-    
-    for root, _, files in os.walk(repo_path):
-        for file in files:
-            if file.endswith(".py"):
-                _scan_python_imports(os.path.join(root, file), tech_stack)
-            elif file.endswith(".js") or file.endswith(".jsx"):
-                _scan_js_imports(os.path.join(root, file), tech_stack)
-
-def _scan_python_imports(file_path, tech_stack):
-    try:
-        with open(file_path, "r") as f:
-            for line in f:
-                if line.startswith(("import ", "from ")):
-                    if "django" in line:
-                        tech_stack["frameworks"].add("Django")
-                    elif "flask" in line:
-                        tech_stack["frameworks"].add("Flask")
-                    elif "torch" in line:
-                        tech_stack["frameworks"].add("PyTorch")
-                    elif "fastapi" in line:
-                        tech_stack["frameworks"].add("FastAPI")
-                    elif "pyramid" in line:
-                        tech_stack["frameworks"].add("Pyramid")
-    except FileNotFoundError:
-        pass
-
-def _scan_js_imports(file_path, tech_stack):
-    try:
-        with open(file_path, "r") as f:
-            for line in f:
-                if "require(" in line or "from " in line or "import " in line:
-                    if "react" in line:
-                        tech_stack["frameworks"].add("React")
-                    elif "vue" in line:
-                        tech_stack["frameworks"].add("Vue.js")
-                    elif "express" in line:
-                        tech_stack["frameworks"].add("Express.js")
-                    elif "angular" in line:
-                        tech_stack["frameworks"].add("Angular")
-                    elif "next" in line:
-                        tech_stack["frameworks"].add("Next.js")
-                    elif "nuxt" in line:
-                        tech_stack["frameworks"].add("Nuxt.js")
-    except FileNotFoundError:
-        pass
+
+    for entry in manifest:
+        if entry["size"] > DEFAULT_MAX_FILE_BYTES:
+            continue  # bundled/vendored file, not where framework imports live
+        kind = IMPORT_SCAN_EXTENSIONS.get(entry["ext"])
+        if kind:
+            for category, label in _file_frameworks(entry["path"], entry["size"], entry["mtime"], kind):
+                tech_stack[category].add(label)
+
+@lru_cache(maxsize=65536)
+def _file_frameworks(path, size, mtime, kind):
+    """Rules matched by one file's import header; cached per (path, size, mtime)."""
+    if kind == "python":
+        return _scan_python_imports(path)
+    return _scan_js_imports(path)
+
+def _scan_python_imports(file_path):
+    found = set()
+    # streamed, size-capped and tolerant of bad bytes (see ingest.iter_lines)
+    for line in iter_lines(file_path):
+        if _PY_BODY_START_RE.match(line):
+            break   # first top-level def/class: the import header is over
+        m = _PY_IMPORT_RE.match(line)
+        if not m:
+            continue
+        modules = [m.group(1)] if m.group(1) else m.group(2).split(",")
+        for module in modules:
+            rule = PYTHON_PACKAGES.get(module.strip().split(" ")[0].split(".")[0].lower())
+            if rule:
+                found.add(rule)
+    return frozenset(found)
+
+def _scan_js_imports(file_path):
+    found = set()
+    for line in iter_lines(file_path):
+        if _JS_BODY_START_RE.match(line):
+            break
+        for spec in _JS_IMPORT_RE.findall(line):
+            rule = JS_PACKAGES.get(_js_package_root(spec))
+            if rule:
+                found.add(rule)
+    return frozenset(found)
 
 def generate_setup_guide(tech_stack):
     question = f"""
@@ -179,12 +222,7 @@ Generate a beginner-friendly guide to set up this project in VSCode:
 4. Why is this tech stack used? What are alternatives generally used for this project type?
 """
 
-    client = genai.Client(http_options=HttpOptions(api_version="v1"))
-    response = client.models.generate_content(
-        model="gemini-2.5-flash",
-        contents=question,
-    )
-    print(response.text)
+    return llm_gateway.generate(question)
 
 def generate_project_overview(tech_stack):
     question = f"""
@@ -199,32 +237,97 @@ boilerplate_files = { "README.md",
                      "Dockerfile", 
                      "Makefile", 
                      "github", 
+                     ".github",
                      "node_modules", 
                      "venv",
                      "setup.py",
                      "package-lock.json",
                      "yarn.lock",}
 
-def filter_boilerplate_files(repo_path):
-    result = {"boilerplate_files": [], "main_code": []}
-    for root, dirs, files in os.walk(repo_path):
-        for file in files:
-            if file in boilerplate_files or root in boilerplate_files:
-                result["boilerplate_files"].append(os.path.join(root, file))
-            else:
-                result["main_code"].append(os.path.join(root, file))
-    
+SOURCE_EXTENSIONS = {".js", ".jsx", ".ts", ".tsx", ".mjs", ".cjs", ".py", ".java", ".go", ".rs",
+                     ".rb", ".php", ".cs", ".cpp", ".c", ".h", ".swift", ".dart", ".vue", ".svelte"}
+
+# ---------- local file ranking ----------
+# Only the top candidates go to the LLM, so the prompt (and its latency) stays the same
+# size however big the repository is. Scores are additive, deterministic heuristics.
+
+DEFAULT_RANK_POOL = 300       # best-scoring files indexed to get call-graph in-degrees
+DEFAULT_PROMPT_FILES = 60     # candidates listed in the LLM prompt
+
+TEST_DIRS = {"test", "tests", "__tests__", "spec", "specs", "e2e", "testing"}
+SIDE_DIRS = {"examples", "example", "samples", "docs", "doc", "scripts", "tools", "benchmarks", "bench",
+             "migrations", "fixtures", "mocks", "__mocks__", "vendor", "third_party", "generated", "stories"}
+CORE_DIRS = {"src", "lib", "app", "core", "pkg", "internal", "server", "api"}
+ENTRY_STEMS = {"main", "app", "index", "server", "cli", "__main__", "manage", "core", "api", "routes", "models"}
+_TEST_NAME_RE = re.compile(r"^test_|_test\.|\.test\.|\.spec\.|_spec\.")
+# generated or bundled output, by file name: generated0.js, api.gen.ts, foo_pb2.py, vendor.bundle.js
+_GENERATED_NAME_RE = re.compile(r"^(?:generated|autogen)|^(?:bundle|vendor)[\d._-]|[._-](?:generated|gen|pb2?|bundle|chunk)[._-]|\.min\.")
+
+def is_boilerplate(entry):
+    """True when the file itself or any directory on its path is in boilerplate_files."""
+    return any(part in boilerplate_files for part in entry["rel"].split("/"))
+
+def score_file(entry, in_degree=0):
+    rel = entry["rel"]
+    parts = rel.split("/")
+    dirs, name = parts[:-1], parts[-1]
+    stem = name.split(".", 1)[0]
+    score = 1.0 if entry["ext"] != ".h" else 0.5
+
+    if _TEST_NAME_RE.search(name) or any(d in TEST_DIRS for d in dirs):
+        score -= 3.0
+    if any(d in SIDE_DIRS for d in dirs):
+        score -= 1.5
+    if _GENERATED_NAME_RE.search(name.lower()):
+        score -= 4.0
+    if any(d in CORE_DIRS for d in dirs):
+        score += 0.5
+    if stem in ENTRY_STEMS:
+        score += 1.0
+    elif stem == "__init__":
+        score -= 0.5
+    score -= 0.15 * max(0, len(dirs) - 2)
+
+    # size: tiny files are glue, huge ones usually generated; 1-50 KB is where logic lives
+    size = entry["size"]
+    if size < 256:
+        score -= 1.5
+    elif size > 300 * 1024:
+        score -= 1.0
+    else:
+        score += 0.8 * (min(math.log10(size), 4.7) - 3.0)
+
+    # files whose functions are called from many other files are the ones to read first
+    score += math.log1p(in_degree)
+    return score
+
+def rank_files(manifest, in_degree=None, limit=None):
+    """Non-boilerplate source files, best first, as [(score, entry)]."""
+    in_degree = in_degree or {}
+    scored = [(score_file(e, in_degree.get(e["path"], 0)), e) for e in manifest
+              if e["ext"] in SOURCE_EXTENSIONS and not is_boilerplate(e)]
+    scored.sort(key=lambda se: (-se[0], se[1]["rel"]))
+    return scored[:limit] if limit is not None else scored
+
+def filter_boilerplate_files(repo_path, manifest=None, local_only=False, max_files=10, in_degree=None,
+                             max_candidates=DEFAULT_PROMPT_FILES):
+    """
+    Key files of the repository: the LLM's answer (text of a Python list), or with local_only
+    the local ranking as a list of paths. in_degree: {file: callers}, see chunking.call_in_degrees.
+    """
+    if manifest is None:
+        manifest = scan_repository(repo_path)
+
+    ranked = rank_files(manifest, in_degree=in_degree)
+    if local_only:
+        return [e["path"] for _, e in ranked[:max_files]]
+
+    candidates = [e["path"] for _, e in ranked[:max_candidates]]
     question = f"""
-The project uses the following non-boilerplate files:
-{result['main_code']}
+The project has {len(ranked)} non-boilerplate source files. These are the {len(candidates)} most likely to matter, ranked by a local heuristic (path, size, language, how often their functions are called):
+{candidates}
 
-Based on the given list, output ONLY a Python list of the KEY files that a software developer working on this project would need to focus on, meaning the files that involve actual thinking rather than setup. These files will be the main ones and can have supporters that they call outside the list of up to 10, but do no more than 10 main files, and your answer text should simply be this list.
+Based on the given list, output ONLY a Python list of the KEY files that a software developer working on this project would need to focus on, meaning the files that involve actual thinking rather than setup. These files will be the main ones and can have supporters that they call outside the list of up to {max_files}, but do no more than {max_files} main files, and your answer text should simply be this list.
 Just output the python list, don't have any pre-amble like "the relevant files are..." or anything like that, because i need to incorporate your response into my code.
 """
-    client = genai.Client(http_options=HttpOptions(api_version="v1"))
-    response = client.models.generate_content(
-        model="gemini-2.5-flash",
-        contents=question,
-    )
-
-    return str(response.text)
\ No newline at end of file
+    return llm_gateway.generate(question)
@@ -0,0 +1,158 @@
+import os, json, time, hashlib, traceback
+import multiprocessing as mp
+from multiprocessing.connection import wait
+
+# Non-interactive analysis of many repositories (`main.py fetch-many`).
+# Each repo runs in its own process, at most `jobs` at a time, so a hang or a crash costs
+# one record instead of the whole batch; a repo over its timeout is terminated. All
+# processes share the on-disk caches: clones under cloned_repos/, the per-repo index
+# cache and the sqlite LLM cache. Clones and index caches are named by checkout_name(),
+# so two sources that share a basename never share a checkout.
+
+CLONE_ROOT = "./cloned_repos"
+DEFAULT_TIMEOUT = 600.0
+
+def read_sources(path):
+    """Repo URLs / local paths, one per line; blank lines and # comments are ignored."""
+    with open(path, encoding="utf-8") as fh:
+        return [line.strip() for line in fh if line.strip() and not line.lstrip().startswith("#")]
+
+def repo_name(source):
+    # display name only; two sources can share it, so never use it for paths on disk
+    return source.rstrip("/").split("/")[-1]
+
+def source_key(source):
+    """Identity of a source: the real path of a local directory, else the URL without a trailing / or .git."""
+    if os.path.isdir(source):
+        return os.path.realpath(source)
+    key = source.strip().rstrip("/")
+    return key[:-4] if key.endswith(".git") else key
+
+def checkout_name(source):
+    """Directory / index-cache name for a source: basename plus a short hash of source_key."""
+    key = source_key(source)
+    return f"{repo_name(key)}-{hashlib.sha1(key.encode('utf-8')).hexdigest()[:8]}"
+
+def _jsonable(obj):
+    if isinstance(obj, (set, frozenset)):
+        return sorted(obj)
+    return str(obj)
+
+def prepare_source(source, depth=None, blob_filter=None):
+    """(directory to analyse, clone status): local directories in place, else a synced clone."""
+    if os.path.isdir(source):
+        return source, "local"
+    from git_sync import sync_repo
+    clone_dir = os.path.join(CLONE_ROOT, checkout_name(source))
+    return clone_dir, sync_repo(source, clone_dir, depth=depth, blob_filter=blob_filter, echo=lambda msg: None)
+
+def analyze_source(source, depth=None, blob_filter=None, llm=None, llm_cache=True, **options):
+    """
+    One batch record for `source`. Local directories are analysed in place; anything else
+    is cloned (or fast-forwarded) under cloned_repos/ first.
+    options are passed to pipeline.analyze_repo (workers, partition, local_only, ...).
+    """
+    import llm_gateway
+    from pipeline import analyze_repo
+    from chunking import retrieve_file_list
+
+    llm_gateway.configure(backend="local" if options.get("local_only") else llm,
+                          use_cache=llm_cache and not options.get("local_only"))
+    name = repo_name(source)
+    record = {"source": source, "repo": name}
+    t = time.perf_counter()
+    clone_dir, record["clone"] = prepare_source(source, depth=depth, blob_filter=blob_filter)
+    clone_time = time.perf_counter() - t
+
+    analysis = analyze_repo(clone_dir, checkout_name(source), **options)
+    results = analysis["results"]
+    index = results["index"]
+    record.update({
+        "status": "ok",
+        "tech_stack": results["tech_stack"],
+        "relevant_files": retrieve_file_list(results["relevant_files"]) or [],
+        "summary": index["summary"],
+        "chapters": index["chapters"],
+        "setup_guide": results.get("setup_guide"),
+        "itinerary": results.get("itinerary"),
+        "timings": {"clone": round(clone_time, 4),
+                    **{k: round(v["duration"], 4) for k, v in analysis["timings"].items()}},
+        "critical_path": analysis["critical_path"],
+        "wall_time": round(analysis["wall_time"] + clone_time, 4),
+    })
+    return record
+
+def _worker(conn, source, options):
+    try:
+        record = analyze_source(source, **options)
+    except BaseException as e:
+        record = {"source": source, "repo": repo_name(source), "status": "error",
+                  "error": f"{e.__class__.__name__}: {e}", "traceback": traceback.format_exc()}
+    try:
+        conn.send_bytes(json.dumps(record, default=_jsonable).encode("utf-8"))
+    finally:
+        conn.close()
+
+def run_batch(sources, jobs=2, timeout=DEFAULT_TIMEOUT, **options):
+    """
+    Yield one record per source, in completion order. Records always carry source, repo and
+    status ("ok", "error" or "timeout") plus elapsed seconds.
+    The same source listed twice never runs twice at once, since both runs would use one clone dir.
+    """
+    pending = list(sources)
+    running = {}   # conn -> (process, source, started)
+    while pending or running:
+        busy = {checkout_name(src) for _, src, _ in running.values()}
+        for src in list(pending):
+            if len(running) >= max(1, jobs):
+                break
+            if checkout_name(src) in busy:
+                continue
+            pending.remove(src)
+            busy.add(checkout_name(src))
+            recv_conn, send_conn = mp.Pipe(duplex=False)
+            proc = mp.Process(target=_worker, args=(send_conn, src, options), name=f"fetch-many:{repo_name(src)}")
+            proc.start()
+            send_conn.close()
+            running[recv_conn] = (proc, src, time.monotonic())
+
+        now = time.monotonic()
+        next_deadline = min(started + timeout for _, _, started in running.values()) if timeout else None
+        ready = wait(list(running), timeout=None if next_deadline is None else max(0.0, next_deadline - now))
+
+        for conn in ready:
+            proc, src, started = running.pop(conn)
+            try:
+                record = json.loads(conn.recv_bytes())
+            except (EOFError, OSError):
+                # the process died without reporting (segfault, OOM kill, os._exit)
+                proc.join()
+                record = {"source": src, "repo": repo_name(src), "status": "error",
+                          "error": f"worker exited with code {proc.exitcode}"}
+            conn.close()
+            proc.join()
+            record["elapsed"] = round(time.monotonic() - started, 4)
+            yield record
+
+        if timeout:
+            now = time.monotonic()
+            for conn, (proc, src, started) in list(running.items()):
+                if now - started >= timeout:
+                    proc.terminate()
+                    proc.join(5)
+                    if proc.is_alive():
+                        proc.kill()
+                        proc.join()
+                    conn.close()
+                    del running[conn]
+                    yield {"source": src, "repo": repo_name(src), "status": "timeout",
+                           "error": f"no result after {timeout:g}s", "elapsed": round(now - started, 4)}
+
+def write_jsonl(records, out):
+    """Stream records to a file object, one JSON line each, flushed as they arrive."""
+    counts = {}
+    for record in records:
+        out.write(json.dumps(record, default=_jsonable, ensure_ascii=False) + "\n")
+        out.flush()
+        counts[record["status"]] = counts.get(record["status"], 0) + 1
+    return counts
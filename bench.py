@@ -0,0 +1,264 @@
+"""
+Benchmarks for the local analysis stages on a synthetic repository.
+
+    python bench.py                           # run, print JSON, compare to bench_baseline.json
+    python bench.py --files 2000 --out b.json # bigger repo, write results
+    python bench.py --save-baseline           # record the current numbers as the baseline
+    python bench.py --startup                 # only check CLI import time against --startup-budget
+
+Exit status is 1 when a stage is slower (or uses more memory) than the baseline by more
+than --tolerance. With --startup it is 1 when `main.py --help` is over budget or fails.
+"""
+import os, sys, json, time, random, shutil, argparse, platform, tempfile, subprocess, tracemalloc
+
+DEFAULT_BASELINE = "bench_baseline.json"
+DEFAULT_STARTUP_BUDGET = 1.0   # seconds for `main.py --help`
+
+# ---------- synthetic repository ----------
+
+def _js_function(name, callees, depth, rng):
+    body = "".join(f"  {c}(arg);\n" for c in callees)
+    inner = "return arg;"
+    for d in range(depth):
+        inner = f"if (arg > {d}) {{ const v{d} = {{ k: [{d}, '{{'] }}; {inner} }}"
+    style = rng.randrange(3)
+    if style == 0:
+        return f"function {name}(arg) {{\n{body}  {inner}\n}}\n"
+    if style == 1:
+        return f"const {name} = (arg) => {{\n{body}  {inner}\n}};\n"
+    return f"export function {name}(arg) {{\n  // calls {len(callees)} helpers\n{body}  {inner}\n}}\n"
+
+def _py_function(name, callees):
+    body = "".join(f"    {c}(arg)\n" for c in callees)
+    return f"def {name}(arg):\n{body}    return arg\n\n"
+
+def generate_repo(root, files=200, funcs_per_file=8, nesting=3, call_density=2.0,
+                  minified=2, pathological=1, seed=0):
+    """Write a JS/TS/Python repo under root; returns the list of source files written."""
+    rng = random.Random(seed)
+    os.makedirs(root, exist_ok=True)
+    with open(os.path.join(root, "package.json"), "w") as fh:
+        json.dump({"dependencies": {"react": "^18", "express": "^4"}, "devDependencies": {"vite": "^5"}}, fh)
+    with open(os.path.join(root, "requirements.txt"), "w") as fh:
+        fh.write("flask==3.0\nsqlalchemy\n")
+    for boring in ("README.md", "LICENSE", ".gitignore"):
+        with open(os.path.join(root, boring), "w") as fh:
+            fh.write("x\n")
+    os.makedirs(os.path.join(root, "node_modules", "left-pad"), exist_ok=True)
+    with open(os.path.join(root, "node_modules", "left-pad", "index.js"), "w") as fh:
+        fh.write("module.exports = function leftPad(s) { return s; };\n")
+
+    names = [f"fn{i}" for i in range(files * funcs_per_file)]
+    written = []
+    for f in range(files):
+        kind = ("js", "ts", "py")[f % 3]
+        sub = os.path.join(root, "src", f"pkg{f % 10}")
+        os.makedirs(sub, exist_ok=True)
+        path = os.path.join(sub, f"mod{f}.{kind}")
+        parts = []
+        if kind == "py":
+            parts.append("import flask\nfrom sqlalchemy import select\n\n")
+        else:
+            parts.append("import React from 'react';\nimport express from 'express';\n\n")
+        for k in range(funcs_per_file):
+            name = names[f * funcs_per_file + k]
+            n_calls = int(call_density) + (rng.random() < call_density % 1)
+            callees = [rng.choice(names) for _ in range(n_calls)]
+            parts.append(_py_function(name, callees) if kind == "py" else _js_function(name, callees, nesting, rng))
+        with open(path, "w") as fh:
+            fh.write("".join(parts))
+        written.append(path)
+
+    dist = os.path.join(root, "src", "dist")
+    os.makedirs(dist, exist_ok=True)
+    for m in range(minified):
+        path = os.path.join(dist, f"bundle{m}.min.js")
+        with open(path, "w") as fh:
+            fh.write("".join(_js_function(f"m{m}_{i}", [f"m{m}_{i + 1}"], nesting, rng).replace("\n", " ")
+                             for i in range(2000)))
+        written.append(path)
+    for p in range(pathological):
+        # one generated file with thousands of functions and very deep nesting
+        path = os.path.join(root, "src", f"generated{p}.js")
+        with open(path, "w") as fh:
+            fh.write("".join(f"function gen{p}_{i}(a) {{ return gen{p}_{(i + 1) % 2000}(a); }}\n" for i in range(2000)))
+            fh.write("function deep() {" + "if (a) {" * 3000 + "}" * 3000 + "}\n")
+        written.append(path)
+    return written
+
+def generate_call_graph(n, funcs_per_file=8, call_density=2.0, seed=0):
+    """CSR call graph of n functions, mostly calling nearby code, for the partition stage alone."""
+    from chunking import _build_graph
+    rng = random.Random(seed)
+    edges = set()
+    for i in range(n):
+        for _ in range(int(call_density) + (rng.random() < call_density % 1)):
+            j = min(n - 1, max(0, i + rng.randint(-50, 50))) if rng.random() < 0.8 else rng.randrange(n)
+            if j != i:
+                edges.add(i * n + j)
+    return _build_graph(n, edges, [i // funcs_per_file for i in range(n)])
+
+# ---------- measurement ----------
+
+def _measure(fn, repeat=3, memory=True):
+    best = None
+    for _ in range(repeat):
+        t = time.perf_counter()
+        result = fn()
+        elapsed = time.perf_counter() - t
+        best = elapsed if best is None else min(best, elapsed)
+    if not memory:
+        return {"seconds": round(best, 6)}, result
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {"seconds": round(best, 6), "peak_kb": peak // 1024}, result
+
+def run_benchmarks(root, sources, repeat=3, graph_sizes=(), funcs_per_file=8, call_density=2.0, seed=0):
+    from chunking import extract_functions, tokenize_function_body, index_repository, _label_propagation
+    import llm_gateway
+    llm_gateway.configure(backend="stub", use_cache=False)
+
+    stages = {}
+    texts = [open(p, encoding="utf-8").read() for p in sources]
+
+    try:
+        from Deterministic_Setup import detect_tech_stack, filter_boilerplate_files, _file_frameworks
+    except ImportError as e:
+        stages["detect_tech_stack"] = stages["filter_boilerplate_files"] = {"skipped": f"import failed: {e}"}
+    else:
+        def cold_detect():
+            # the per-file import cache would otherwise make every repeat after the first a warm run
+            _file_frameworks.cache_clear()
+            return detect_tech_stack(root)
+        stages["detect_tech_stack"], _ = _measure(cold_detect, repeat)
+        stages["filter_boilerplate_files"], _ = _measure(lambda: filter_boilerplate_files(root), repeat)
+
+    stages["extract_functions"], funcs = _measure(lambda: [f for t in texts for f in extract_functions(t)], repeat)
+    stages["extract_functions"]["items"] = len(funcs)
+    stages["tokenize_function_body"], toks = _measure(lambda: [tokenize_function_body(f["code"]) for f in funcs], repeat)
+    stages["tokenize_function_body"]["items"] = sum(len(t) for t in toks)
+    stages["index_repository"], index = _measure(lambda: index_repository(sources), repeat)
+    stages["index_repository"]["items"] = index["summary"]["functions"]
+    for n in graph_sizes:
+        graph = generate_call_graph(n, funcs_per_file=funcs_per_file, call_density=call_density, seed=seed)
+        stage = f"label_propagation_{n}"
+        # time only: tracing allocations would make the 100k point take minutes
+        stages[stage], comps = _measure(lambda: _label_propagation(graph, max_size=40), repeat, memory=False)
+        stages[stage].update(items=n, chapters=len(comps))
+    return stages
+
+def measure_startup(repeat=3):
+    """Wall time of `main.py --help` in a fresh interpreter, plus the slowest imports of main."""
+    here = os.path.dirname(os.path.abspath(__file__))
+    main_py = os.path.join(here, "main.py")
+    if not os.path.exists(main_py):
+        return {"skipped": f"no CLI at {main_py}"}
+    best = None
+    for _ in range(repeat):
+        t = time.perf_counter()
+        proc = subprocess.run([sys.executable, main_py, "--help"], cwd=here, capture_output=True, text=True)
+        elapsed = time.perf_counter() - t
+        if proc.returncode != 0:
+            # a CLI that no longer starts is the worst startup regression, not a skip
+            return {"error": f"main.py --help exited with {proc.returncode}: {proc.stderr.strip().splitlines()[-1:]}"}
+        best = elapsed if best is None else min(best, elapsed)
+
+    # -X importtime lines: "import time: self [us] | cumulative | imported package"
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", "import main"], cwd=here,
+                          capture_output=True, text=True)
+    imports = []
+    for line in proc.stderr.splitlines():
+        parts = [p.strip() for p in line.split("|")]
+        if len(parts) == 3 and parts[1].isdigit():
+            imports.append((int(parts[1]), parts[2]))
+    slowest = [{"module": m, "cumulative_ms": round(us / 1000, 1)} for us, m in sorted(imports, reverse=True)[:10]]
+    return {"seconds": round(best, 6), "slowest_imports": slowest}
+
+def compare(results, baseline, tolerance):
+    """List of human-readable regressions (empty when everything is within tolerance)."""
+    regressions = []
+    for name, cur in results["stages"].items():
+        base = baseline.get("stages", {}).get(name)
+        if not base or "skipped" in cur or "skipped" in base:
+            continue
+        for metric in ("seconds", "peak_kb"):
+            if base.get(metric) and cur[metric] > base[metric] * (1 + tolerance):
+                regressions.append(f"{name}.{metric}: {cur[metric]} vs baseline {base[metric]}")
+    return regressions
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--files", type=int, default=200)
+    ap.add_argument("--funcs-per-file", type=int, default=8)
+    ap.add_argument("--nesting", type=int, default=3)
+    ap.add_argument("--call-density", type=float, default=2.0)
+    ap.add_argument("--minified", type=int, default=2)
+    ap.add_argument("--pathological", type=int, default=1)
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--graph-sizes", type=lambda v: [int(x) for x in v.split(",") if x], default=[20000, 100000],
+                    help="function counts for the label-propagation timing points (comma-separated)")
+    ap.add_argument("--repeat", type=int, default=3)
+    ap.add_argument("--out", help="write results JSON here (default: stdout)")
+    ap.add_argument("--baseline", default=DEFAULT_BASELINE)
+    ap.add_argument("--save-baseline", action="store_true")
+    ap.add_argument("--tolerance", type=float, default=0.25, help="allowed slowdown, 0.25 = 25%%")
+    ap.add_argument("--keep", help="generate the repo here and keep it")
+    ap.add_argument("--startup", action="store_true", help="only measure CLI startup time")
+    ap.add_argument("--startup-budget", type=float, default=DEFAULT_STARTUP_BUDGET,
+                    help="fail when `main.py --help` takes longer than this many seconds")
+    args = ap.parse_args(argv)
+
+    if args.startup:
+        startup = measure_startup(repeat=args.repeat)
+        print(json.dumps(startup, indent=2))
+        if "error" in startup:
+            print(f"REGRESSION startup: {startup['error']}", file=sys.stderr)
+            return 1
+        if "skipped" in startup:
+            return 0
+        if startup["seconds"] > args.startup_budget:
+            print(f"REGRESSION startup: {startup['seconds']}s > budget {args.startup_budget}s", file=sys.stderr)
+            return 1
+        return 0
+
+    config = {k: getattr(args, k) for k in ("files", "funcs_per_file", "nesting", "call_density",
+                                            "minified", "pathological", "seed")}
+    root = args.keep or tempfile.mkdtemp(prefix="git-teach-bench-")
+    try:
+        sources = generate_repo(root, **config)
+        stages = run_benchmarks(root, sources, repeat=args.repeat, graph_sizes=args.graph_sizes,
+                                funcs_per_file=args.funcs_per_file, call_density=args.call_density, seed=args.seed)
+    finally:
+        if not args.keep:
+            shutil.rmtree(root, ignore_errors=True)
+
+    config["graph_sizes"] = args.graph_sizes
+    results = {"config": config, "python": platform.python_version(), "stages": stages}
+    text = json.dumps(results, indent=2)
+    if args.out:
+        with open(args.out, "w") as fh:
+            fh.write(text + "\n")
+    else:
+        print(text)
+
+    if args.save_baseline:
+        with open(args.baseline, "w") as fh:
+            fh.write(text + "\n")
+        return 0
+    if not os.path.exists(args.baseline):
+        print(f"no baseline at {args.baseline}; run with --save-baseline to record one", file=sys.stderr)
+        return 0
+    with open(args.baseline) as fh:
+        baseline = json.load(fh)
+    if baseline.get("config") != config:
+        print("baseline was recorded with a different config; not comparing", file=sys.stderr)
+        return 0
+    regressions = compare(results, baseline, args.tolerance)
+    for r in regressions:
+        print(f"REGRESSION {r}", file=sys.stderr)
+    return 1 if regressions else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,94 +1,349 @@
-import re, ast, os, json, math
+import re, ast, os, sys, json, math
+from array import array
+from bisect import bisect_right
 from collections import Counter, defaultdict, deque
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
 from typing import List, Dict, Tuple, Set
 
-def retrieve_file_list(response: str):
-    # Match everything between the first `[` and the matching `]`, including newlines
-    match = re.search(r'\[.*?\]', response, re.DOTALL)
-    if match:
-        try:
-            return ast.literal_eval(match.group())
-        except (SyntaxError, ValueError) as e:
-            print(f"Failed to parse list: {e}")
+import tracing
+from ingest import plan_ingestion, decode_bytes, DEFAULT_MAX_FILE_BYTES, DEFAULT_MAX_TOTAL_BYTES, FALLBACK_ENCODING
+from index_cache import blob_sha_bytes, load_index_cache, save_index_cache, cached_file, store_file
+from retrieval import BM25Index
+
+def retrieve_file_list(response):
+    # local-only runs hand over the ranked list itself
+    if isinstance(response, list):
+        return response
+    # Match everything between the first `[` and the last `]`, including newlines, so
+    # bracketed path segments such as pages/[id].js survive; then the shortest match
+    error = None
+    for pattern in (r'\[.*\]', r'\[.*?\]'):
+        match = re.search(pattern, response, re.DOTALL)
+        if match:
+            try:
+                return ast.literal_eval(match.group())
+            except (SyntaxError, ValueError) as e:
+                error = e
+    if error is not None:
+        print(f"Failed to parse list: {error}")
     return None
 
 CALL_RE = re.compile(r'([A-Za-z_$][A-Za-z0-9_$]*)\s*\(') 
 
-def index_repository(files, keep_symbols=True, top_quantile=0.15, min_edge=1.0):
-    """Return a repo-level index ready for LLM consumption."""
-    # 1) Collect all functions across all files
-    all_funcs = []            # list of dicts
-    per_file_source = {}      # file -> source text
-    for fp in files:
-        if not os.path.exists(fp): 
+_NOT_CALLS = {"if", "for", "while", "switch", "catch", "with", "return", "function", "typeof",
+              "await", "new", "super", "elif", "print", "def", "class", "and", "or", "not", "in"}
+_RE_MASKED = re.compile(r"""/\*[\s\S]*?\*/|//[^\n]*|'(?:[^'\\\n]|\\.)*'|"(?:[^"\\\n]|\\.)*"|`(?:[^`\\]|\\.)*`""")
+_RE_NOT_NEWLINE = re.compile(r"[^\n]")
+
+def _mask_comments_and_strings(code: str) -> str:
+    """Blank out comments/strings but keep every offset and newline in place."""
+    return _RE_MASKED.sub(lambda m: _RE_NOT_NEWLINE.sub(" ", m.group(0)), code)
+
+def _call_sites(code: str, spans, offsets):
+    """
+    One pass over a file: every `name(` outside comments/strings, attributed to the
+    innermost enclosing function span. Returns {span index: [[callee, line], ...]}.
+    The header of a function (its own `name(`) is not a call.
+    """
+    masked = _mask_comments_and_strings(code)
+    calls = defaultdict(list)
+    stack = []       # indices of spans enclosing the current offset, innermost last
+    nxt = 0
+    for m in CALL_RE.finditer(masked):
+        pos = m.start()
+        while stack and spans[stack[-1]][2] < pos:
+            stack.pop()
+        while nxt < len(spans) and spans[nxt][0] <= pos:
+            if spans[nxt][2] >= pos:
+                stack.append(nxt)
+            nxt += 1
+            while stack and spans[stack[-1]][2] < pos:
+                stack.pop()
+        if not stack:
+            continue  # module-level call
+        inner = stack[-1]
+        if pos < spans[inner][1] and pos >= spans[inner][0]:
+            # inside the header (name/params) of the innermost function
+            continue
+        name = m.group(1)
+        if name in _NOT_CALLS:
             continue
-        src = open(fp, "r", encoding="utf-8").read()
-        per_file_source[fp] = src
-        for f in extract_functions(src):
-            f["file"] = fp
-            all_funcs.append(f)
+        calls[inner].append([name.lower(), _line_of(offsets, pos)])
+    return calls
 
-    if not all_funcs:
-        return {"summary": {"files": 0, "functions": 0, "chapters": 0}, "functions": [], "chapters": []}
-    
-    raw_tokens = [tokenize_function_body(f["code"], keep_symbols=keep_symbols) for f in all_funcs]
+_RE_JS_IMPORT  = re.compile(r"""^\s*import\s+([^;'"]+?)\s+from\s+['"]([^'"]+)['"]""", re.MULTILINE)
+_RE_JS_REQUIRE = re.compile(r"""(?:const|let|var)\s+(\{[^}]*\}|[A-Za-z_$][\w$]*)\s*=\s*require\(\s*['"]([^'"]+)['"]\s*\)""")
+_RE_PY_IMPORT  = re.compile(r"^\s*from\s+([\w.]+)\s+import\s+(?:\(([^)]*)\)|([^(\n]+))", re.MULTILINE)
+_RE_IMPORT_NAME = re.compile(r"([A-Za-z_$][\w$]*)(?:\s+as\s+([A-Za-z_$][\w$]*)|\s*:\s*([A-Za-z_$][\w$]*))?")
 
-    for f, toks in zip(all_funcs, raw_tokens):
-        f["token_count"] = len(toks)
+def _file_imports(code: str) -> Dict[str, List[str]]:
+    """
+    local name (lowercased) -> [module specifier, imported name (lowercased)], for named
+    imports in JS/TS/Python. Aliases are keyed by the alias: `import { a as b }`,
+    `const { a: b } = require(...)` and `from m import a as b` all give b -> [m, a].
+    Brace and parenthesised name lists may span lines.
+    """
+    imports = {}
+
+    def add(nm, spec):
+        original = nm.group(1)
+        if original in ("as", "type"):
+            return
+        local = nm.group(2) or nm.group(3) or original
+        imports[local.lower()] = [spec, original.lower()]
+
+    for m in _RE_JS_IMPORT.finditer(code):
+        for nm in _RE_IMPORT_NAME.finditer(m.group(1).replace("*", " ")):
+            add(nm, m.group(2))
+    for m in _RE_JS_REQUIRE.finditer(code):
+        for nm in _RE_IMPORT_NAME.finditer(m.group(1)):
+            add(nm, m.group(2))
+    for m in _RE_PY_IMPORT.finditer(code):
+        names = m.group(2) if m.group(2) is not None else m.group(3)
+        for nm in _RE_IMPORT_NAME.finditer(re.sub(r"#[^\n]*", "", names)):
+            add(nm, m.group(1).replace(".", "/"))
+    return imports
+
+def _module_key(spec: str) -> str:
+    # "./utils/api.js" / "../utils/api" / "utils.api" -> "utils/api"
+    spec = spec.replace("\\", "/")
+    parts = [p for p in spec.split("/") if p not in ("", ".", "..")]
+    if parts:
+        parts[-1] = os.path.splitext(parts[-1])[0]
+        if parts[-1] == "index" and len(parts) > 1:
+            parts.pop()
+    return "/".join(parts).lower()
+
+def _file_module_keys(fp: str) -> Set[str]:
+    # every path suffix a module specifier could resolve to
+    parts = [p for p in fp.replace("\\", "/").split("/") if p not in ("", ".", "..")]
+    parts[-1] = os.path.splitext(parts[-1])[0]
+    keys = {"/".join(parts[i:]).lower() for i in range(len(parts))}
+    if parts[-1] in ("index", "__init__") and len(parts) > 1:
+        keys |= {"/".join(parts[i:-1]).lower() for i in range(len(parts) - 1)}
+    return keys
+
+def _ingest_file(fp, keep_symbols=True):
+    """Read one file, extract its functions, call sites and imports, and tokenize. Runs in a worker process.
+
+    Returns (fp, blob_sha, funcs, imports); blob_sha is None when the file is missing.
+    """
+    if not os.path.exists(fp):
+        return fp, None, [], {}
+    with open(fp, "rb") as fh:
+        data = fh.read()
+    src, encoding = decode_bytes(data)
+    offsets = _line_offsets(src)
+    spans = _function_spans(src, offsets)
+    calls = _call_sites(src, spans, offsets)
+    byte_at = _byte_offsets(src, [p for start, _, close in spans for p in (start, close + 1)], encoding)
+    funcs = []
+    for k, span in enumerate(spans):
+        # code is only needed here for tokenizing; the index keeps byte offsets instead
+        f = _function_dict(src, offsets, span)
+        toks = tokenize_function_body(f.pop("code"), keep_symbols=keep_symbols)
+        f["file"] = fp
+        f["start_byte"] = byte_at[span[0]]
+        f["end_byte"] = byte_at[span[2] + 1]
         f["tokens"] = toks
+        f["token_count"] = len(toks)
+        f["calls"] = calls.get(k, [])
+        funcs.append(f)
+    return fp, blob_sha_bytes(data), funcs, _file_imports(src)
+
+def _byte_offsets(src: str, char_offsets, encoding="utf-8") -> Dict[int, int]:
+    """Byte offset in the file of each char offset, in one incremental pass."""
+    wanted = sorted(set(char_offsets))
+    base = 3 if encoding == "utf-8-sig" else 0   # decode_bytes strips the BOM
+    if encoding == FALLBACK_ENCODING or src.isascii():
+        return {c: c + base for c in wanted}
+    out = {}
+    last_char, last_byte = 0, base
+    for c in wanted:
+        last_byte += len(src[last_char:c].encode("utf-8", errors="surrogatepass"))
+        last_char = c
+        out[c] = last_byte
+    return out
+
+def _ingest_files(files, keep_symbols=True, workers=None):
+    """
+    Ingest files serially (workers None/1) or on a process pool.
+    Results always come back in input order so function ids are stable.
+    """
+    files = list(files)
+    if not workers or workers <= 1 or len(files) < 2:
+        return [_ingest_file(fp, keep_symbols) for fp in files]
+    workers = min(workers, len(files))
+    chunksize = max(1, len(files) // (workers * 4))
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(_ingest_file, files, [keep_symbols] * len(files), chunksize=chunksize))
+
+def _load_files(files, keep_symbols, workers, cache_path, max_file_bytes, max_total_bytes):
+    """
+    Budget-check, then read/extract every file (cached files are not re-parsed).
+    Returns (accepted files, per-file (funcs, imports) or None, skipped, cache hits, misses).
+    """
+    files, skipped = plan_ingestion(files, max_file_bytes=max_file_bytes, max_total_bytes=max_total_bytes)
+    skipped = [{"file": fp, "reason": reason} for fp, reason in skipped]
+    cache = load_index_cache(cache_path, keep_symbols) if cache_path else None
+
+    with tracing.span("index.read", files=len(files), workers=workers or 1) as sp:
+        per_file = [None] * len(files)
+        todo = []
+        for pos, fp in enumerate(files):
+            hit = cached_file(cache, fp) if cache is not None else None
+            if hit is None:
+                todo.append(pos)
+            else:
+                per_file[pos] = hit
+        hits, misses = len(files) - len(todo), len(todo)
+
+        for pos, (fp, sha, funcs, imports) in zip(todo, _ingest_files([files[p] for p in todo], keep_symbols=keep_symbols, workers=workers)):
+            if sha is None:
+                continue
+            per_file[pos] = (funcs, imports)
+            if cache is not None:
+                store_file(cache, fp, sha, funcs, imports)
+        if cache is not None and misses:
+            save_index_cache(cache_path, cache)
+        sp.set(cache_hits=hits, cache_misses=misses)
+    return files, per_file, skipped, hits, misses
 
-    name_to_ids = defaultdict(list)
-    for i, f in enumerate(all_funcs):
-        # map simple name (last segment if 'Class.method')
-        base = f["name"].split(".")[-1].lower()
-        if base and base != "<anonymous>":
-            name_to_ids[base].append(i)
-
-    def internal_callees(snippet: str):
-        # best-effort callee names from code
-        return {m.group(1).lower() for m in CALL_RE.finditer(snippet)}
-
-    adj = [defaultdict(float) for _ in all_funcs]
-    for i, f in enumerate(all_funcs):
-        # internal calls
-        for callee in internal_callees(f["code"]):
-            for j in name_to_ids.get(callee, []):
+def _resolve_calls(funcs, resolver, add_edge):
+    # add_edge(i * n + j) for every call from function i to a definition j
+    n = len(funcs)
+    for i, f in enumerate(funcs):
+        for callee in {name for name, _ in f["calls"]}:
+            for j in resolver.resolve(callee, f["file"]):
                 if j != i:
-                    adj[i][j] += 3.0
-                    adj[j][i] += 0.0  # directed preference, but we keep symmetric weights below as needed
-
-    # same-file mild cohesion
-    by_file = defaultdict(list)
-    for i, f in enumerate(all_funcs):
-        by_file[f["file"]].append(i)
-    for _, idxs in by_file.items():
-        for i in idxs:
-            for j in idxs:
-                if i != j:
-                    adj[i][j] += 0.5
-
-    # 4) Thresholded connected components = chapters
-    comps = _components_from_adj(adj, min_edge=min_edge)
-
-    # 5) Order within each chapter: try topological-ish by call edges; fallback to file/line
-    chapters = []
-    for comp in comps:
-        order = _order_component(all_funcs, comp, adj)
-        chapters.append({
-            "title": _title_from_tokens([all_funcs[k]["tokens"] for k in comp]),
-            "functions": [
-                {
-                    "id": k,
-                    "file": all_funcs[k]["file"],
-                    "name": all_funcs[k]["name"],
-                    "start_line": all_funcs[k]["start_line"],
-                    "end_line": all_funcs[k]["end_line"],
-                    "token_count": all_funcs[k]["token_count"]
-                } for k in order
-            ]
-        })
-
-    # 6) Build a lookup so the LLM can fetch code by id quickly
+                    add_edge(i * n + j)
+
+def call_in_degrees(files, keep_symbols=True, workers=None, cache_path=None, max_global_fanout=3,
+                    max_file_bytes=DEFAULT_MAX_FILE_BYTES, max_total_bytes=DEFAULT_MAX_TOTAL_BYTES):
+    """
+    {file: calls into its functions from other files}: only extraction and call
+    resolution, no vocab, partitioning or search. Shares the index cache with index_repository, which then
+    finds these files already parsed.
+    """
+    files, per_file, _, _, _ = _load_files(files, keep_symbols, workers, cache_path, max_file_bytes, max_total_bytes)
+    with tracing.span("index.in_degrees", files=len(files)) as sp:
+        funcs, file_imports = [], {}
+        for fp, entry in zip(files, per_file):
+            if entry is not None:
+                funcs.extend(entry[0])
+                file_imports[fp] = entry[1]
+        edges = set()
+        _resolve_calls(funcs, _CallResolver(funcs, file_imports, max_global_fanout=max_global_fanout), edges.add)
+        n = len(funcs)
+        counts = {}
+        for code in edges:
+            caller, callee = divmod(code, n)
+            fp = funcs[callee]["file"]
+            if funcs[caller]["file"] != fp:   # calls within a file say nothing about its importance
+                counts[fp] = counts.get(fp, 0) + 1
+        sp.set(functions=n, call_edges=len(edges))
+    return counts
+
+def index_repository(files, keep_symbols=True, top_quantile=0.02, min_edge=1.0, workers=None, cache_path=None,
+                     max_global_fanout=3, partition="components", max_chapter_size=None, max_iterations=20,
+                     max_file_bytes=DEFAULT_MAX_FILE_BYTES, max_total_bytes=DEFAULT_MAX_TOTAL_BYTES):
+    """Return a repo-level index ready for LLM consumption.
+
+    workers: number of processes used to read/extract/tokenize files (None or 1 = in-process).
+    cache_path: per-repository JSON cache; only files whose blob SHA changed are re-parsed.
+    max_global_fanout: a call that is neither same-file nor imported only links to a
+        same-named function elsewhere when at most this many exist.
+    partition: "components" (thresholded connected components) or "labels" (weighted label
+        propagation; chapters never grow beyond max_chapter_size functions).
+    max_file_bytes / max_total_bytes: ingestion budgets; missing, binary, oversized or
+        over-budget files are skipped and listed in summary["skipped"] with the reason.
+    top_quantile: share of the most widespread tokens treated as boring (left out of
+        chapter titles and of the BM25 "search" index).
+    """
+    with tracing.span("index.ingest", files=len(files), workers=workers or 1) as sp:
+        # 1) Collect all functions across all files (cached files are not re-parsed)
+        files, per_file, skipped, hits, misses = _load_files(files, keep_symbols, workers, cache_path,
+                                                             max_file_bytes, max_total_bytes)
+
+        # tokens arrive as strings (workers/cache); intern them into one vocab of int ids
+        all_funcs = []            # list of dicts
+        file_imports = {}         # file -> {local name: [module specifier, imported name]}
+        vocab = TokenVocab()
+        for fp, entry in zip(files, per_file):
+            if entry is None:
+                continue
+            funcs, file_imports[fp] = entry
+            for f in funcs:
+                f = dict(f)
+                f["tokens"] = vocab.encode(f["tokens"])
+                all_funcs.append(f)
+        sp.set(cache_hits=hits, cache_misses=misses, functions=len(all_funcs))
+
+    indexed_files = len(file_imports)
+    cache_stats = {"hits": hits, "misses": misses}
+
+    if not all_funcs:
+        return {"summary": {"files": indexed_files, "functions": 0, "chapters": 0, "cache": cache_stats, "skipped": skipped},
+                "functions": [], "chapters": [], "lookup": {}, "search": None}
+
+    with tracing.span("index.call_graph") as sp:
+        # 2) Resolve call sites: same-file definitions, then imported ones, then (rare) global names
+        resolver = _CallResolver(all_funcs, file_imports, max_global_fanout=max_global_fanout)
+        call_edges = set()
+        n = len(all_funcs)
+        _resolve_calls(all_funcs, resolver, call_edges.add)
+
+        # same-file mild cohesion is implicit: the graph only keeps each function's file id
+        file_index = {}
+        file_ids = [file_index.setdefault(f["file"], len(file_index)) for f in all_funcs]
+        graph = _build_graph(n, call_edges, file_ids)
+        sp.set(functions=n, call_edges=len(call_edges))
+
+    with tracing.span("index.partition", mode=partition) as sp:
+        # 4) Chapters: thresholded connected components, or size-bounded label propagation
+        if partition == "components":
+            comps = _components_from_graph(graph, min_edge=min_edge)
+        elif partition == "labels":
+            comps = _label_propagation(graph, max_size=max_chapter_size, max_iterations=max_iterations)
+        else:
+            raise ValueError(f"unknown partition mode: {partition!r}")
+        sp.set(chapters=len(comps))
+
+    # tokens found in most functions say nothing about any one of them (document frequency)
+    boring = build_adaptive_boring_set([t for f in all_funcs for t in set(f["tokens"])], top_quantile=top_quantile)
+
+    with tracing.span("index.order_chapters", chapters=len(comps)):
+        # 5) Order within each chapter: try topological-ish by call edges; fallback to file/line
+        chapters = []
+        chapter_of = [0] * n
+        for c, comp in enumerate(comps):
+            order = _order_component(all_funcs, comp, graph)
+            for k in comp:
+                chapter_of[k] = c
+            chapters.append({
+                "title": _title_from_tokens([all_funcs[k]["tokens"] for k in comp], vocab, boring),
+                "functions": [
+                    {
+                        "id": k,
+                        "file": all_funcs[k]["file"],
+                        "name": all_funcs[k]["name"],
+                        "start_line": all_funcs[k]["start_line"],
+                        "end_line": all_funcs[k]["end_line"],
+                        "token_count": all_funcs[k]["token_count"]
+                    } for k in order
+                ]
+            })
+
+    with tracing.span("index.search") as sp:
+        # 6) BM25 inverted index so a question can retrieve just the functions it is about
+        search = BM25Index([f["tokens"] for f in all_funcs], vocab, boring=boring, chapter_of=chapter_of)
+        sp.set(terms=search.terms, boring=len(boring))
+
+    # 7) Build a lookup so the LLM can fetch code by id quickly (code_reader.function_code)
+    in_degree = array("I", bytes(4 * n))     # distinct callers per function
+    for code in call_edges:
+        in_degree[code % n] += 1
     functions_view = [
         {
             "id": i,
@@ -96,104 +351,545 @@ def index_repository(files, keep_symbols=True, top_quantile=0.15, min_edge=1.0):
             "name": f["name"],
             "start_line": f["start_line"],
             "end_line": f["end_line"],
-            "token_count": f["token_count"]
+            "token_count": f["token_count"],
+            "in_degree": in_degree[i]
         } for i, f in enumerate(all_funcs)
     ]
-    lookup = {i: {"code": f["code"], "file": f["file"], "name": f["name"]} for i, f in enumerate(all_funcs)}
+    lookup = {i: {"file": f["file"], "name": f["name"], "start_byte": f["start_byte"], "end_byte": f["end_byte"]}
+              for i, f in enumerate(all_funcs)}
 
     return {
         "summary": {
-            "files": len(per_file_source),
+            "files": indexed_files,
             "functions": len(all_funcs),
-            "chapters": len(chapters)
+            "chapters": len(chapters),
+            "cache": cache_stats,
+            "skipped": skipped,
+            "partition": {
+                "mode": partition,
+                "modularity": round(_modularity(graph, comps), 4),
+                "sizes": _size_distribution(comps)
+            },
+            "search": {"terms": search.terms, "boring": len(boring)}
         },
         "functions": functions_view,   # light index (for itinerary table)
         "chapters": chapters,          # chapter itinerary (ordered)
-        "lookup": lookup               # id -> code/name/file for chapter rendering
+        "lookup": lookup,              # id -> file/name/byte span for chapter rendering
+        "search": search               # BM25Index over function tokens (retrieval.py)
     }
 
 # ---------- helpers ----------
 
-def _components_from_adj(adj, min_edge=1.0):
-    n = len(adj)
-    seen = [False]*n
-    comps = []
-    for s in range(n):
-        if seen[s]: continue
-        q = deque([s]); seen[s] = True; comp=[s]
-        while q:
-            u = q.popleft()
-            for v, w in adj[u].items():
-                if w >= min_edge and not seen[v]:
-                    seen[v] = True
-                    q.append(v)
-                    comp.append(v)
-        comps.append(sorted(comp))
-    return comps
-
-def _order_component(funcs, comp, adj):
-    # prefer call-edge driven order: i -> j if strong call weight
-    indeg = {i: 0 for i in comp}
-    edges = defaultdict(set)
-    for i in comp:
-        for j, w in adj[i].items():
-            if j in comp and w >= 2.5:
-                edges[i].add(j)
+class _CallResolver:
+    """Ranks the definitions a callee name can refer to from a given file."""
+
+    def __init__(self, funcs, file_imports, max_global_fanout=3):
+        self.max_global_fanout = max_global_fanout
+        self.file_imports = file_imports
+        self.by_name = defaultdict(list)            # name -> ids
+        self.by_file_name = defaultdict(list)       # (file, name) -> ids
+        self.file_of = [f["file"] for f in funcs]
+        self.module_keys = {fp: _file_module_keys(fp) for fp in set(self.file_of)}
+        for i, f in enumerate(funcs):
+            # map simple name (last segment if 'Class.method')
+            base = f["name"].split(".")[-1].lower()
+            if not base or base == "<anonymous>":
+                continue
+            self.by_name[base].append(i)
+            self.by_file_name[(f["file"], base)].append(i)
+
+    def resolve(self, callee, fp):
+        same_file = self.by_file_name.get((fp, callee))
+        if same_file:
+            return same_file
+        imported_as = self.file_imports.get(fp, {}).get(callee)
+        if imported_as is not None:
+            # an alias resolves against the name it was imported under
+            spec, original = imported_as
+            key = _module_key(spec)
+            imported = [j for j in self.by_name.get(original, []) if key in self.module_keys[self.file_of[j]]] if key else []
+            if imported:
+                return imported
+        candidates = self.by_name.get(callee, [])
+        if not candidates:
+            return []
+        if len(candidates) <= self.max_global_fanout:
+            return candidates
+        return []
+
+CALL_WEIGHT = 3.0       # i calls j
+COHESION_WEIGHT = 0.5   # i and j live in the same file (never stored as an edge)
+
+def _build_graph(n, call_edges, file_ids):
+    """
+    CSR adjacency over call edges only. call_edges holds i*n+j codes (i calls j).
+    Memory is O(n + real edges); same-file cohesion is derived from file_ids on demand.
+    """
+    indptr = array("q", [0] * (n + 1))
+    indices = array("q")
+    weights = array("d")
+    for code in sorted(call_edges):
+        i, j = divmod(code, n)
+        indptr[i + 1] += 1
+        indices.append(j)
+        weights.append(CALL_WEIGHT)
+    for i in range(n):
+        indptr[i + 1] += indptr[i]
+    return {"n": n, "indptr": indptr, "indices": indices, "weights": weights,
+            "file_ids": array("q", file_ids)}
+
+def _neighbors(graph, i):
+    """(j, weight) for every call edge i -> j, same-file cohesion included in the weight."""
+    file_ids = graph["file_ids"]
+    indices, weights = graph["indices"], graph["weights"]
+    for k in range(graph["indptr"][i], graph["indptr"][i + 1]):
+        j = indices[k]
+        w = weights[k]
+        if file_ids[i] == file_ids[j]:
+            w += COHESION_WEIGHT
+        yield j, w
+
+def _find(parent, x):
+    while parent[x] != x:
+        parent[x] = parent[parent[x]]
+        x = parent[x]
+    return x
+
+def _union(parent, a, b):
+    ra, rb = _find(parent, a), _find(parent, b)
+    if ra != rb:
+        # keep the smaller id as root so component order is stable
+        if ra < rb:
+            parent[rb] = ra
+        else:
+            parent[ra] = rb
+
+def _components_from_graph(graph, min_edge=1.0):
+    n = graph["n"]
+    parent = array("q", range(n))
+    for i in range(n):
+        for j, w in _neighbors(graph, i):
+            if w >= min_edge:
+                _union(parent, i, j)
+
+    # cohesion alone links a whole file: chain its members instead of k^2 pairs
+    if COHESION_WEIGHT >= min_edge:
+        last_in_file = {}
+        for i, fid in enumerate(graph["file_ids"]):
+            if fid in last_in_file:
+                _union(parent, last_in_file[fid], i)
+            last_in_file[fid] = i
+
+    groups = defaultdict(list)
+    for i in range(n):
+        groups[_find(parent, i)].append(i)
+    return [groups[r] for r in sorted(groups)]
+
+def _transpose(graph):
+    """Reverse CSR (callee -> callers) so label propagation sees edges in both directions."""
+    n = graph["n"]
+    indptr, indices, weights = graph["indptr"], graph["indices"], graph["weights"]
+    counts = array("q", [0] * (n + 1))
+    for j in indices:
+        counts[j + 1] += 1
+    for i in range(n):
+        counts[i + 1] += counts[i]
+    r_indices = array("q", [0] * len(indices))
+    r_weights = array("d", [0.0] * len(indices))
+    fill = array("q", counts[:n])
+    for i in range(n):
+        for k in range(indptr[i], indptr[i + 1]):
+            j = indices[k]
+            r_indices[fill[j]] = i
+            r_weights[fill[j]] = weights[k]
+            fill[j] += 1
+    return {"n": n, "indptr": counts, "indices": r_indices, "weights": r_weights, "file_ids": graph["file_ids"]}
+
+def _undirected(graph):
+    """One CSR holding each node's outgoing edges followed by its incoming ones."""
+    n = graph["n"]
+    rev = _transpose(graph)
+    f_ptr, f_ind, f_w = graph["indptr"], graph["indices"], graph["weights"]
+    r_ptr, r_ind, r_w = rev["indptr"], rev["indices"], rev["weights"]
+    indptr = array("q", [0])
+    indices = array("q")
+    weights = array("d")
+    for i in range(n):
+        indices += f_ind[f_ptr[i]:f_ptr[i + 1]]
+        indices += r_ind[r_ptr[i]:r_ptr[i + 1]]
+        weights += f_w[f_ptr[i]:f_ptr[i + 1]]
+        weights += r_w[r_ptr[i]:r_ptr[i + 1]]
+        indptr.append(len(indices))
+    return {"n": n, "indptr": indptr, "indices": indices, "weights": weights, "file_ids": graph["file_ids"]}
+
+def _label_propagation(graph, max_size=None, max_iterations=20):
+    """
+    Weighted label propagation over call edges (both directions) plus implicit same-file
+    cohesion. A node only joins a label that has room (size < max_size), so no chapter
+    exceeds the cap. Cohesion votes come from per-file label counts, never from k^2 pairs:
+    each file offers one cohesion label, its largest label with room; when that fills up
+    the next node of the file seeds a new one, so a big file splits into full chapters
+    rather than one chapter plus singletons.
+    Votes accumulate in one array indexed by label, reset after each node, so the inner
+    loop walks array slices instead of building a dict per node. After the first sweep
+    only nodes whose neighbours changed label, or whose file's cohesion label changed,
+    are looked at again.
+    """
+    n = graph["n"]
+    und = _undirected(graph)
+    indptr, indices, weights = und["indptr"], und["indices"], und["weights"]
+    fids = graph["file_ids"]
+    cap = max_size or n
+    labels = array("q", range(n))
+    size = array("q", [1] * n)
+    votes = array("d", bytes(8 * n))
+    file_counts = {}   # file id -> {label: members of that file with the label}
+    file_members = defaultdict(list)
+    for i in range(n):
+        fc = file_counts.setdefault(fids[i], {})
+        fc[i] = fc.get(i, 0) + 1
+        file_members[fids[i]].append(i)
+    dominant = {}      # file id -> the file's cohesion label
+    active = bytearray(b"\x01" * n)
+
+    def wake_file(fid):
+        for j in file_members[fid]:
+            active[j] = 1
+
+    for _ in range(max_iterations):
+        for fid, fc in file_counts.items():
+            room = [kv for kv in fc.items() if size[kv[0]] < cap]
+            dom = max(room or fc.items(), key=lambda kv: kv[1])[0]
+            if dominant.get(fid, dom) != dom:
+                wake_file(fid)
+            dominant[fid] = dom
+        changed = 0
+        for i in range(n):
+            if not active[i]:
+                continue
+            active[i] = 0
+            cur = labels[i]
+            fid = fids[i]
+            fc = file_counts[fid]
+            dom = dominant[fid]
+            if dom != cur and size[dom] >= cap and size[cur] < cap:
+                # the file's label is full: this node's label takes over for its file-mates
+                dominant[fid] = dom = cur
+                wake_file(fid)
+            candidates = [cur, dom]
+            lo, hi = indptr[i], indptr[i + 1]
+            for lab, w in zip(map(labels.__getitem__, indices[lo:hi]), weights[lo:hi]):
+                if not votes[lab]:
+                    candidates.append(lab)
+                votes[lab] += w
+
+            best, best_w = cur, None
+            for lab in candidates:
+                w = votes[lab]
+                if w < 0.0:
+                    continue        # already scored (listed twice)
+                votes[lab] = -1.0
+                if lab != cur and size[lab] >= cap:
+                    continue
+                w += COHESION_WEIGHT * (fc.get(lab, 0) - (lab == cur))
+                # ties keep the current label, then the smallest
+                if best_w is None or w > best_w or (w == best_w and best != cur and (lab == cur or lab < best)):
+                    best, best_w = lab, w
+            for lab in candidates:
+                votes[lab] = 0.0
+
+            if best != cur:
+                labels[i] = best
+                size[cur] -= 1
+                size[best] += 1
+                fc[cur] -= 1
+                if not fc[cur]:
+                    del fc[cur]
+                fc[best] = fc.get(best, 0) + 1
+                changed += 1
+                for j in indices[lo:hi]:
+                    active[j] = 1
+                if best != dom and fc[best] > fc.get(dom, 0):
+                    dominant[fid] = best
+                    wake_file(fid)
+        if not changed:
+            break
+
+    groups = defaultdict(list)
+    for i in range(n):
+        groups[labels[i]].append(i)
+    return sorted(groups.values(), key=lambda g: g[0])
+
+def _modularity(graph, comps):
+    """Newman modularity of a partition, on undirected call weights + same-file cohesion."""
+    n = graph["n"]
+    if n == 0:
+        return 0.0
+    label = array("q", [0] * n)
+    for c, comp in enumerate(comps):
+        for i in comp:
+            label[i] = c
+    fids = graph["file_ids"]
+    file_size = Counter(fids)
+    degree = array("d", [COHESION_WEIGHT * (file_size[fids[i]] - 1) for i in range(n)])
+    internal = [0.0] * len(comps)   # sum of A_ij over ordered pairs inside each community
+    indptr, indices, weights = graph["indptr"], graph["indices"], graph["weights"]
+    for i in range(n):
+        for k in range(indptr[i], indptr[i + 1]):
+            j, w = indices[k], weights[k]
+            degree[i] += w
+            degree[j] += w
+            if label[i] == label[j]:
+                internal[label[i]] += 2 * w
+    for (fid, c), k in Counter((fids[i], label[i]) for i in range(n)).items():
+        internal[c] += COHESION_WEIGHT * k * (k - 1)
+
+    two_m = sum(degree)
+    if two_m == 0:
+        return 0.0
+    total = [0.0] * len(comps)
+    for i in range(n):
+        total[label[i]] += degree[i]
+    return sum(internal[c] / two_m - (total[c] / two_m) ** 2 for c in range(len(comps)))
+
+def _size_distribution(comps):
+    sizes = sorted(len(c) for c in comps)
+    if not sizes:
+        return {}
+    buckets = {"1": 0, "2-5": 0, "6-20": 0, "21-100": 0, ">100": 0}
+    for k in sizes:
+        if k == 1: buckets["1"] += 1
+        elif k <= 5: buckets["2-5"] += 1
+        elif k <= 20: buckets["6-20"] += 1
+        elif k <= 100: buckets["21-100"] += 1
+        else: buckets[">100"] += 1
+    return {"max": sizes[-1], "median": sizes[len(sizes) // 2], "histogram": buckets}
+
+def _strongly_connected(nodes, succ):
+    """Iterative Tarjan: SCCs of the subgraph `succ` (node -> successor list), O(V+E)."""
+    index, low = {}, {}
+    on_stack = set()
+    stack, sccs = [], []
+    counter = 0
+    for root in nodes:
+        if root in index:
+            continue
+        index[root] = low[root] = counter; counter += 1
+        stack.append(root); on_stack.add(root)
+        work = [(root, iter(succ[root]))]
+        while work:
+            v, it = work[-1]
+            for w in it:
+                if w not in index:
+                    index[w] = low[w] = counter; counter += 1
+                    stack.append(w); on_stack.add(w)
+                    work.append((w, iter(succ[w])))
+                    break
+                if w in on_stack:
+                    low[v] = min(low[v], index[w])
+            else:
+                work.pop()
+                if work:
+                    u = work[-1][0]
+                    low[u] = min(low[u], low[v])
+                if low[v] == index[v]:
+                    scc = []
+                    while True:
+                        w = stack.pop()
+                        on_stack.discard(w)
+                        scc.append(w)
+                        if w == v:
+                            break
+                    sccs.append(scc)
+    return sccs
+
+def _order_component(funcs, comp, graph):
+    # prefer call-edge driven order: i -> j if strong call weight.
+    # Call cycles (recursion, mutual callbacks) are condensed into one node first, so a
+    # cycle only reorders its own members (file/line) instead of the whole chapter.
+    members = set(comp)
+    succ = {i: sorted({j for j, w in _neighbors(graph, i) if j in members and w >= 2.5 and j != i})
+            for i in comp}
+    sccs = _strongly_connected(comp, succ)
+
+    rep = [min(scc) for scc in sccs]   # smallest member: the tie-break order of each SCC
+    scc_of = {}
+    for c, scc in enumerate(sccs):
+        scc.sort(key=lambda k: (funcs[k]["file"], funcs[k]["start_line"]))
+        for k in scc:
+            scc_of[k] = c
+
+    dag = [set() for _ in sccs]
+    indeg = [0] * len(sccs)
     for i in comp:
-        for j in edges[i]:
-            indeg[j] += 1
-    q = deque([i for i in comp if indeg[i]==0])
+        for j in succ[i]:
+            a, b = scc_of[i], scc_of[j]
+            if a != b and b not in dag[a]:
+                dag[a].add(b)
+                indeg[b] += 1
+
+    # Kahn over the condensed DAG; roots in component order
+    roots = sorted((c for c in range(len(sccs)) if indeg[c] == 0), key=rep.__getitem__)
+    q = deque(roots)
     out = []
     while q:
-        u = q.popleft()
-        out.append(u)
-        for v in edges[u]:
-            indeg[v] -= 1
-            if indeg[v]==0:
-                q.append(v)
-    if len(out) != len(comp):
-        # fallback: file then line
-        return sorted(comp, key=lambda k: (funcs[k]["file"], funcs[k]["start_line"]))
+        c = q.popleft()
+        out.extend(sccs[c])
+        for d in sorted(dag[c], key=rep.__getitem__):
+            indeg[d] -= 1
+            if indeg[d] == 0:
+                q.append(d)
     return out
 
-def _title_from_tokens(token_lists, k_top=3):
+def _title_from_tokens(token_id_lists, vocab, boring=None, k_top=3):
     # tiny, adaptive title: top tokens across the chapter (after boring filter)
     bag = Counter()
-    for tl in token_lists:
-        bag.update(tl)
-    return " ".join([t for t,_ in bag.most_common(k_top)]) or "chapter"
-
-FUNC_PATTERNS = [
-    r"function\s+\w+\s*\([^)]*\)\s*{(?:[^{}]|\{[^{}]*\})*}",              # function foo(...) { ...{...}... }
-    r"const\s+\w+\s*=\s*\([^)]*\)\s*=>\s*{(?:[^{}]|\{[^{}]*\})*}",       # const foo = (...) => { ... }
-    r"\w+\s*\([^)]*\)\s*{(?:[^{}]|\{[^{}]*\})*}"                         # methodName(...) { ... }
-]
-# Note: patterns allow one-level nested braces in bodies. Good enough for most UI code.
-# For very complex nesting, prefer Node-TS parser subprocess later.
+    for tl in token_id_lists:
+        bag.update(apply_boring_filter(tl, boring))
+    # only words make a title: no operators/punctuation, no bare numbers
+    tokens = vocab.tokens
+    words = [t for t, _ in bag.most_common() if tokens[t][:1].isalnum() and not tokens[t].isdigit()]
+    return " ".join(vocab.decode(words[:k_top])) or "chapter"
 
-def extract_functions(code: str) -> List[Dict]:
-    funcs = []
-    for pat in FUNC_PATTERNS:
-        for m in re.finditer(pat, code, flags=re.DOTALL):
-            snippet = m.group(0)
-            name = guess_name(snippet)
-            start_line = code.count("\n", 0, m.start()) + 1
-            end_line   = code.count("\n", 0, m.end()) + 1
-            funcs.append({
-                "name": name,
-                "start_line": start_line,
-                "end_line": end_line,
-                "code": snippet
-            })
-    # de-dup (overlaps can happen if patterns match the same thing)
+# ---------- function extraction ----------
+# Single forward pass over the source: jump between "interesting" characters,
+# skip strings/comments, and match braces at any depth with a stack. Each
+# balanced {...} is then checked for a function header just before its "{".
+
+_RE_INTERESTING = re.compile(r"[{}'\"`/]")
+_RE_SQ_STRING   = re.compile(r"'(?:[^'\\\n]|\\.)*'")
+_RE_DQ_STRING   = re.compile(r'"(?:[^"\\\n]|\\.)*"')
+_RE_TPL_STRING  = re.compile(r"`(?:[^`\\]|\\.)*`", re.DOTALL)
+_STRING_RES = {"'": _RE_SQ_STRING, '"': _RE_DQ_STRING, "`": _RE_TPL_STRING}
+
+# headers are matched against a short window ending right before "(" of the params
+_RE_FUNC_HEAD   = re.compile(r"\bfunction\*?\s*(?:(?:[^\W\d]|\$)[\w$]*)?\s*$")      # function foo(...) {
+_RE_ARROW_HEAD  = re.compile(r"\b(?:const|let|var)\s+(?:[^\W\d]|\$)[\w$]*\s*=\s*(?:async\s*)?$")  # const foo = (...) => {
+_RE_METHOD_HEAD = re.compile(r"(?<![\w$.])(?:[^\W\d]|\$)[\w$]*\s*$")     # methodName(...) {
+_NOT_METHODS = {"if", "for", "while", "switch", "catch", "with", "return", "function", "typeof", "await", "new", "super"}
+_MAX_PARAMS = 4096   # how far back we look for the "(" matching a ")"
+_MAX_HEAD   = 128    # window before "(" used to recognise the header
+
+def _line_offsets(code: str) -> List[int]:
+    offsets = [0]
+    pos = code.find("\n")
+    while pos != -1:
+        offsets.append(pos + 1)
+        pos = code.find("\n", pos + 1)
+    return offsets
+
+def _line_of(offsets: List[int], pos: int) -> int:
+    return bisect_right(offsets, pos)  # 1-based
+
+def _brace_pairs(code: str) -> List[Tuple[int, int]]:
+    """All balanced (open, close) brace offsets, ignoring braces in strings/comments."""
+    pairs, stack = [], []
+    n = len(code)
+    i = 0
+    while True:
+        m = _RE_INTERESTING.search(code, i)
+        if not m:
+            break
+        i = m.start()
+        c = code[i]
+        if c == "{":
+            stack.append(i)
+        elif c == "}":
+            if stack:
+                pairs.append((stack.pop(), i))
+        elif c == "/":
+            nxt = code[i + 1] if i + 1 < n else ""
+            if nxt == "/":
+                j = code.find("\n", i)
+                i = n if j == -1 else j
+                continue
+            if nxt == "*":
+                j = code.find("*/", i + 2)
+                i = n if j == -1 else j + 2
+                continue
+        else:
+            sm = _STRING_RES[c].match(code, i)
+            if sm:
+                i = sm.end()
+                continue
+        i += 1
+    return pairs
+
+def _function_start(code: str, brace: int):
+    """Offset where the function owning the "{" at `brace` starts, or None."""
+    j = brace - 1
+    while j >= 0 and code[j].isspace():
+        j -= 1
+    arrow = False
+    if j >= 1 and code[j - 1] == "=" and code[j] == ">":
+        arrow = True
+        j -= 2
+        while j >= 0 and code[j].isspace():
+            j -= 1
+    if j < 0 or code[j] != ")":
+        return None
+
+    # walk back to the matching "("
+    depth = 0
+    k = j
+    limit = max(0, j - _MAX_PARAMS)
+    while k >= limit:
+        ch = code[k]
+        if ch == ")":
+            depth += 1
+        elif ch == "(":
+            depth -= 1
+            if depth == 0:
+                break
+        k -= 1
+    if k < limit or depth != 0:
+        return None
+
+    lo = max(0, k - _MAX_HEAD)
+    head = code[lo:k]
+    if arrow:
+        m = _RE_ARROW_HEAD.search(head)
+        return lo + m.start() if m else None
+    m = _RE_FUNC_HEAD.search(head)
+    if m:
+        return lo + m.start()
+    m = _RE_METHOD_HEAD.search(head)
+    if m and m.group(0).strip() not in _NOT_METHODS:
+        return lo + m.start()
+    return None
+
+def _function_spans(code: str, offsets: List[int]) -> List[Tuple[int, int, int]]:
+    """(start, open brace, close brace) per function, sorted by start, one per line range."""
+    spans = []
+    for open_pos, close_pos in _brace_pairs(code):
+        start = _function_start(code, open_pos)
+        if start is not None:
+            spans.append((start, open_pos, close_pos))
+    spans.sort()
+
+    # de-dup (a one-liner can nest another function on the same lines)
     seen = set()
     uniq = []
-    for f in funcs:
-        key = (f["start_line"], f["end_line"])
+    for span in spans:
+        key = (_line_of(offsets, span[0]), _line_of(offsets, span[2]))
         if key not in seen:
-            uniq.append(f); seen.add(key)
+            seen.add(key)
+            uniq.append(span)
     return uniq
 
+def _function_dict(code: str, offsets: List[int], span) -> Dict:
+    start, open_pos, close_pos = span
+    return {
+        "name": guess_name(code[start:open_pos]),
+        "start_line": _line_of(offsets, start),
+        "end_line": _line_of(offsets, close_pos),
+        "code": code[start:close_pos + 1]
+    }
+
+def extract_functions(code: str) -> List[Dict]:
+    offsets = _line_offsets(code)
+    return [_function_dict(code, offsets, span) for span in _function_spans(code, offsets)]
+
 def guess_name(snippet: str) -> str:
     # 1) export/default/async/generator function declarations
     m = re.search(r"\bexport\s+(?:default\s+)?function\s+([A-Za-z_$][A-Za-z0-9_$]*)\s*\(", snippet)
@@ -253,17 +949,23 @@ def _strip_comments_and_strings(code: str) -> str:
 
 # split identifiers: fooBar_BAZ9 -> ["foo","bar","baz","9"]
 _RE_WORDISH = re.compile(r"[A-Za-z_$][A-Za-z0-9_$]*|\d+(?:\.\d+)?")
-def _split_identifier(tok: str) -> List[str]:
-    if not re.match(r"[A-Za-z_$]", tok):
-        return [tok]
-    # snake + camel split
-    parts = re.split(r"[_$]+", tok)
+_RE_IDENT_SEP = re.compile(r"[_$]+")
+_RE_CAMEL = re.compile(r"[A-Z]+(?=[A-Z][a-z0-9])|[A-Z]?[a-z0-9]+|[A-Z]+")
+_SPLIT_CACHE_SIZE = 1 << 16
+
+@lru_cache(maxsize=_SPLIT_CACHE_SIZE)
+def _split_identifier_cached(tok: str) -> Tuple[str, ...]:
+    # identifiers like `props` / `useState` repeat thousands of times: split each once
     out = []
-    for p in parts:
+    for p in _RE_IDENT_SEP.split(tok):
         # split camel: "XMLHttpRequest2" -> ["xml","http","request","2"]
-        segs = re.findall(r"[A-Z]+(?=[A-Z][a-z0-9])|[A-Z]?[a-z0-9]+|[A-Z]+", p)
-        out.extend(segs)
-    return [s.lower() for s in out if s]
+        out.extend(_RE_CAMEL.findall(p))
+    return tuple(sys.intern(s.lower()) for s in out if s)
+
+def _split_identifier(tok: str) -> List[str]:
+    if not tok or tok[0].isdigit():
+        return [tok]
+    return list(_split_identifier_cached(tok))
 
 _RE_SYMBOLS = re.compile(r"==|!=|<=|>=|=>|\+\+|--|&&|\|\||[-+*/%&|^~=<>!?:;.,{}\[\]()]")
 
@@ -278,19 +980,43 @@ def tokenize_function_body(snippet: str, keep_symbols: bool = True) -> List[str]
     body = _strip_comments_and_strings(snippet)
     tokens = []
 
-    # words & numbers
-    for m in _RE_WORDISH.finditer(body):
-        tok = m.group(0)
-        if re.match(r"[A-Za-z_$]", tok):
-            tokens.extend(_split_identifier(tok))
-        else:
+    # words & numbers (_RE_WORDISH only yields identifiers or numbers)
+    for tok in _RE_WORDISH.findall(body):
+        if tok[0].isdigit():
             tokens.append(tok)  # numbers kept as-is
+        else:
+            tokens.extend(_split_identifier_cached(tok))
 
     if keep_symbols:
         tokens.extend(_RE_SYMBOLS.findall(body))
 
     return tokens
 
+class TokenVocab:
+    """Interns tokens to dense integer ids shared by every function in an index."""
+
+    def __init__(self):
+        self.ids: Dict[str, int] = {}
+        self.tokens: List[str] = []
+
+    def __len__(self):
+        return len(self.tokens)
+
+    def intern(self, tok: str) -> int:
+        tid = self.ids.get(tok)
+        if tid is None:
+            tid = self.ids[tok] = len(self.tokens)
+            self.tokens.append(tok)
+        return tid
+
+    def encode(self, tokens) -> array:
+        ids = self.ids
+        intern = self.intern
+        return array("I", [ids[t] if t in ids else intern(t) for t in tokens])
+
+    def decode(self, token_ids) -> List[str]:
+        return [self.tokens[i] for i in token_ids]
+
 def build_adaptive_boring_set(tokenized_funcs: List[str], top_quantile: float = 0.15) -> Set[str]:
     df = Counter(tokenized_funcs)
     if not df:
@@ -301,6 +1027,14 @@ def build_adaptive_boring_set(tokenized_funcs: List[str], top_quantile: float =
     n = len(sorted_tokens)
     k = max(1, int(top_quantile * n))  # number of tokens to keep
 
+    # never split a run of equal counts: on flat distributions the cut would otherwise
+    # drop arbitrary rare tokens along with the common ones. A run at the very top is
+    # the most widespread tokens (often "in every function"), so it goes in whole.
+    if k < n:
+        cutoff = sorted_tokens[k][1]
+        if cutoff == sorted_tokens[0][1] and cutoff > 1:
+            return {token for token, count in sorted_tokens if count == cutoff}
+        return {token for token, count in sorted_tokens[:k] if count > cutoff}
     return {token for token, _ in sorted_tokens[:k]}
 
 def apply_boring_filter(tokens: List[str], boring: Set[str]) -> List[str]:
@@ -0,0 +1,71 @@
+import os, mmap, threading
+from collections import OrderedDict
+
+from ingest import FALLBACK_ENCODING
+
+# The index only stores (file, start_byte, end_byte) per function; source text is read on
+# demand from a memory-mapped file. A small LRU keeps recently used files mapped, so
+# resident memory stays flat no matter how large the repository is.
+
+MAX_OPEN_FILES = 16
+
+class CodeReader:
+    def __init__(self, max_open=MAX_OPEN_FILES):
+        self.max_open = max_open
+        self._maps = OrderedDict()   # path -> (stat key, mmap or None for empty files)
+        self._lock = threading.Lock()
+
+    def _get_map(self, path):
+        st = os.stat(path)
+        key = (st.st_size, st.st_mtime_ns)
+        entry = self._maps.get(path)
+        if entry is not None and entry[0] == key:
+            self._maps.move_to_end(path)
+            return entry[1]
+        if entry is not None:
+            self._close(entry[1])
+        if st.st_size == 0:
+            mm = None
+        else:
+            with open(path, "rb") as fh:
+                mm = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+        self._maps[path] = (key, mm)
+        while len(self._maps) > self.max_open:
+            _, (_, old) = self._maps.popitem(last=False)
+            self._close(old)
+        return mm
+
+    @staticmethod
+    def _close(mm):
+        if mm is not None:
+            mm.close()
+
+    def read(self, path, start, end) -> str:
+        """Text of bytes [start, end) of path ("" if the file is gone)."""
+        with self._lock:
+            try:
+                mm = self._get_map(path)
+            except OSError:
+                return ""
+            if mm is None:
+                return ""
+            data = mm[start:end]
+        try:
+            return data.decode("utf-8")
+        except UnicodeDecodeError:
+            return data.decode(FALLBACK_ENCODING)
+
+    def close(self):
+        with self._lock:
+            for _, mm in self._maps.values():
+                self._close(mm)
+            self._maps.clear()
+
+_reader = CodeReader()
+
+def read_span(path, start, end) -> str:
+    return _reader.read(path, start, end)
+
+def function_code(entry) -> str:
+    """Source of an index `lookup` / `functions` entry (needs file, start_byte, end_byte)."""
+    return _reader.read(entry["file"], entry["start_byte"], entry["end_byte"])
@@ -0,0 +1,128 @@
+import re, json
+
+from code_reader import function_code
+
+# Builds the per-turn LLM context from an index_repository() result.
+# Instead of repr(chapter_guide) (every function's source, every turn) we send a compact
+# chapter outline plus the code of the one chapter being discussed (and, for a question, the
+# functions BM25 retrieves for it first), capped to a token budget.
+
+DEFAULT_TOKEN_BUDGET = 8000
+DEFAULT_TOP_K = 8      # functions retrieved for a free-form question
+RETRIEVAL_SHARE = 0.6  # of the code budget, when there is also a current chapter to show
+_CHARS_PER_TOKEN = 4   # rough, model-agnostic estimate
+
+def estimate_tokens(text: str) -> int:
+    return (len(text) + _CHARS_PER_TOKEN - 1) // _CHARS_PER_TOKEN
+
+def _dumps(obj) -> str:
+    return json.dumps(obj, separators=(",", ":"), ensure_ascii=False)
+
+def chapter_outline(chapter_guide, max_names=None):
+    """[[number, title, [file:name, ...]], ...] with optional per-chapter name cap."""
+    outline = []
+    for n, ch in enumerate(chapter_guide.get("chapters", []), 1):
+        names = [f"{f['file']}:{f['name']}" for f in ch["functions"]]
+        if max_names is not None and len(names) > max_names:
+            names = names[:max_names] + [f"...+{len(names) - max_names} more"]
+        outline.append([n, ch["title"], names])
+    return outline
+
+def _fit_outline(chapter_guide, budget):
+    # shrink the per-chapter name list until the outline fits its share of the budget
+    for cap in (None, 8, 3, 1, 0):
+        outline = chapter_outline(chapter_guide, max_names=cap)
+        if estimate_tokens(_dumps(outline)) <= budget:
+            return outline
+    return outline[:max(1, budget // 8)]
+
+def _add_code(block, functions, lookup, used, budget):
+    # append each function's code to block["code"] until the budget runs out; returns tokens used
+    for f in functions:
+        entry = lookup.get(f["id"]) or lookup.get(str(f["id"]))
+        if entry is None:
+            continue
+        item = {"file": f["file"], "name": f["name"], "lines": [f["start_line"], f["end_line"]], "code": function_code(entry)}
+        cost = estimate_tokens(_dumps(item)) + 1
+        if used + cost > budget:
+            room = (budget - used - estimate_tokens(_dumps({**item, "code": ""})) - 1) * _CHARS_PER_TOKEN
+            if room > 200:
+                item["code"] = item["code"][:room - 20] + "\n/* truncated */"
+                block["code"].append(item)
+                used += estimate_tokens(_dumps(item)) + 1
+            block["omitted"] = len(functions) - len(block["code"])
+            break
+        block["code"].append(item)
+        used += cost
+    return used
+
+def pack_context(chapter_guide, chapter=None, budget=DEFAULT_TOKEN_BUDGET, outline_share=0.3,
+                 question=None, top_k=DEFAULT_TOP_K, retrieval_share=RETRIEVAL_SHARE):
+    """
+    Serialize the index for one turn. `chapter` is a 0-based chapter index (None = outline only).
+    With a `question` and a search index, the top_k BM25 matches for it come first, using at
+    most retrieval_share of the remaining budget; the rest always goes to the current
+    chapter, so a follow-up like "explain this more" still carries code.
+    Returns (payload, estimated_tokens); the payload never exceeds `budget` tokens.
+    """
+    outline = _fit_outline(chapter_guide, int(budget * outline_share))
+    payload = {"summary": chapter_guide.get("summary", {}), "chapters": outline}
+    used = estimate_tokens(_dumps(payload))
+
+    chapters = chapter_guide.get("chapters", [])
+    lookup = chapter_guide.get("lookup", {})
+    search = chapter_guide.get("search")
+    has_chapter = chapter is not None and 0 <= chapter < len(chapters)
+
+    sent = set()
+    if question and search is not None:
+        scores = search.scores(question)
+        functions = chapter_guide["functions"]
+        top = [functions[i] for i, score in search.top_functions(question, top_k, scores) if score > 0]
+        if top:
+            relevant = {"question_terms": len(search.query_ids(question)), "code": []}
+            relevant["chapters"] = [[c + 1, chapters[c]["title"], hits] for c, _, hits in search.top_chapters(question, 3, scores)]
+            used += estimate_tokens(_dumps(relevant))
+            limit = used + int((budget - used) * retrieval_share) if has_chapter else budget
+            used = _add_code(relevant, top, lookup, used, limit)
+            sent = {f["id"] for f in top}
+            payload["relevant"] = relevant
+
+    if has_chapter:
+        ch = chapters[chapter]
+        current = {"chapter": chapter + 1, "title": ch["title"], "code": []}
+        used += estimate_tokens(_dumps(current))
+        used = _add_code(current, [f for f in ch["functions"] if f["id"] not in sent], lookup, used, budget)
+        payload["current"] = current
+
+    text = _dumps(payload)
+    return text, estimate_tokens(text)
+
+def chapter_prompt(chapter_guide, chapter, budget=DEFAULT_TOKEN_BUDGET, skill_level="beginner"):
+    """
+    (prompt, context tokens) for explaining one chapter. It depends only on the chapter, not
+    on how the user asked for it, so a prefetched answer is exactly the one they would get.
+    """
+    context, used = pack_context(chapter_guide, chapter=chapter, budget=budget)
+    prompt = (f"Explain chapter {chapter + 1} of this codebase to a {skill_level} developer: what these "
+              f"functions do, how they work together, and what to read first.\n{context}")
+    return prompt, used
+
+_RE_CHAPTER_REQUEST = re.compile(r"^\s*(?:chapter|ch\.?)?\s*#?(\d+)\s*$", re.IGNORECASE)
+_ADVANCE_WORDS = {"", "y", "yes", "ok", "okay", "next", "ready", "go", "continue", "sure"}
+
+def is_navigation(answer: str) -> bool:
+    """True for "3"/"chapter 3"/"yes"/"next"; False for a free-form question."""
+    return bool(_RE_CHAPTER_REQUEST.match(answer)) or answer.strip().lower() in _ADVANCE_WORDS
+
+def requested_chapter(answer: str, current: int, count: int) -> int:
+    """
+    Chapter the user wants next: "3"/"chapter 3" jumps, "yes"/"next" advances,
+    anything else is a question about the current chapter.
+    """
+    m = _RE_CHAPTER_REQUEST.match(answer)
+    if m:
+        return min(max(int(m.group(1)) - 1, 0), max(count - 1, 0))
+    if answer.strip().lower() in _ADVANCE_WORDS:
+        return min(current + 1, max(count - 1, 0))
+    return max(current, 0)
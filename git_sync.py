@@ -0,0 +1,72 @@
+import os
+
+# Clone / refresh helpers for fetch_repo.
+#   depth=1            shallow clone (history is never read by the pipeline)
+#   blob_filter        partial clone, e.g. "blob:none": blobs are fetched on checkout only
+#   sparse_paths       sparse checkout (cone mode) limited to these directories; top-level
+#                      files such as package.json/requirements.txt are always kept
+#   update             existing checkouts get `fetch` + fast-forward instead of being skipped
+# Local paths (including bare repositories) work as sources too.
+# GitPython is imported inside the functions so CLI startup does not pay for it.
+
+def _source_url(source: str) -> str:
+    # --depth/--filter are ignored for plain local paths; file:// makes git honour them
+    if os.path.exists(source) and "://" not in source:
+        return "file://" + os.path.abspath(source)
+    return source
+
+def clone_repo(source, dest, depth=None, blob_filter=None, sparse_paths=None):
+    import git
+    options = {}
+    if depth:
+        options["depth"] = depth
+        options["single_branch"] = True
+    if blob_filter:
+        options["filter"] = blob_filter
+    if sparse_paths:
+        options["sparse"] = True
+    repo = git.Repo.clone_from(_source_url(source), dest, **options)
+    if sparse_paths:
+        repo.git.sparse_checkout("set", *sparse_paths)
+    return repo
+
+def update_repo(dest, sparse_paths=None):
+    """Fetch and fast-forward an existing checkout. Returns "updated", "up-to-date" or a reason string."""
+    import git
+    repo = git.Repo(dest)
+    if sparse_paths:
+        repo.git.sparse_checkout("set", *sparse_paths)
+    if repo.head.is_detached:
+        return "detached HEAD, not updated"
+    tracking = repo.active_branch.tracking_branch()
+    if tracking is None:
+        return "no upstream branch, not updated"
+    # no --depth here: a shallow clone then fetches just the new commits, which
+    # connect to what we have, so the fast-forward below stays possible
+    repo.remote(tracking.remote_name).fetch(tracking.remote_head)
+    before = repo.head.commit.hexsha
+    if before == tracking.commit.hexsha:
+        return "up-to-date"
+    if repo.is_dirty(untracked_files=False):
+        return "local changes, not updated"
+    if not repo.is_ancestor(before, tracking.commit):
+        return "diverged from upstream, not updated"
+    repo.git.merge("--ff-only", tracking.name)
+    return "updated"
+
+def sync_repo(source, dest, depth=None, blob_filter=None, sparse_paths=None, update=True, echo=print):
+    """Make `dest` a current checkout of `source`: clone if missing, else optionally fast-forward."""
+    import git
+    if not os.path.exists(dest):
+        echo(f"Cloning repository {source} into {dest}...")
+        clone_repo(source, dest, depth=depth, blob_filter=blob_filter, sparse_paths=sparse_paths)
+        return "cloned"
+    if not update:
+        echo(f"Repository already exists in {dest}. Skipping update...")
+        return "skipped"
+    try:
+        status = update_repo(dest, sparse_paths=sparse_paths)
+    except (git.GitCommandError, git.InvalidGitRepositoryError, ValueError) as e:
+        status = f"update failed ({e.__class__.__name__})"
+    echo(f"Repository in {dest}: {status}.")
+    return status
@@ -0,0 +1,67 @@
+import os, json, hashlib
+
+# Per-repository cache of extracted functions + tokens + imports, one entry per file.
+# Entries are keyed by the file's git blob SHA, so an unchanged file is never re-parsed.
+# A size/mtime match is trusted without re-hashing; otherwise the blob SHA decides.
+
+CACHE_VERSION = 5
+_HASH_CHUNK = 1 << 20
+
+def blob_sha(path: str) -> str:
+    """Same id `git hash-object` gives the file, so tracked and untracked files share one key space."""
+    size = os.path.getsize(path)
+    h = hashlib.sha1(f"blob {size}\0".encode())
+    with open(path, "rb") as fh:
+        for chunk in iter(lambda: fh.read(_HASH_CHUNK), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+def blob_sha_bytes(data: bytes) -> str:
+    h = hashlib.sha1(f"blob {len(data)}\0".encode())
+    h.update(data)
+    return h.hexdigest()
+
+def load_index_cache(cache_path: str, keep_symbols: bool = True) -> dict:
+    empty = {"version": CACHE_VERSION, "keep_symbols": keep_symbols, "files": {}}
+    try:
+        with open(cache_path, "r", encoding="utf-8") as fh:
+            cache = json.load(fh)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return empty
+    if cache.get("version") != CACHE_VERSION or cache.get("keep_symbols") != keep_symbols:
+        return empty
+    return cache
+
+def save_index_cache(cache_path: str, cache: dict):
+    # drop entries for files that disappeared from the checkout
+    cache["files"] = {fp: e for fp, e in cache["files"].items() if os.path.exists(fp)}
+    os.makedirs(os.path.dirname(cache_path) or ".", exist_ok=True)
+    tmp = cache_path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as fh:
+        json.dump(cache, fh, separators=(",", ":"))
+    os.replace(tmp, cache_path)
+
+def cached_file(cache: dict, fp: str):
+    """(funcs, imports) cached for fp if the file is unchanged, else None."""
+    entry = cache["files"].get(fp)
+    if entry is None:
+        return None
+    try:
+        st = os.stat(fp)
+    except OSError:
+        return None
+    if entry["size"] == st.st_size and entry["mtime_ns"] == st.st_mtime_ns:
+        return entry["funcs"], entry["imports"]
+    if entry["size"] == st.st_size and blob_sha(fp) == entry["sha"]:
+        # touched (checkout, copy) but content is identical
+        entry["mtime_ns"] = st.st_mtime_ns
+        return entry["funcs"], entry["imports"]
+    return None
+
+def store_file(cache: dict, fp: str, sha: str, funcs, imports):
+    try:
+        st = os.stat(fp)
+    except OSError:
+        return
+    cache["files"][fp] = {"sha": sha, "size": st.st_size, "mtime_ns": st.st_mtime_ns,
+                         "funcs": funcs, "imports": imports}
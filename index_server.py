@@ -0,0 +1,348 @@
+import json, time, threading
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+from urllib.request import Request, urlopen
+from urllib.error import HTTPError
+
+from batch import repo_name, source_key, checkout_name, prepare_source
+from code_reader import function_code
+from context_packer import pack_context, DEFAULT_TOKEN_BUDGET
+import llm_gateway
+
+# `main.py serve`: a localhost HTTP daemon that keeps analysed repositories in memory so
+# chapter, function and search queries skip the clone/scan/index startup entirely.
+# Indexes are held in an LRU keyed by source (see batch.source_key), so two repositories
+# that share a basename stay separate entries, each with its own clone and index cache
+# (batch.checkout_name); "reindex" re-runs the pipeline,
+# where the on-disk index cache means only files whose blob changed are parsed again.
+# `main.py query` (and request() below) is the thin client.
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+DEFAULT_MAX_REPOS = 8
+
+class ApiError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+class IndexStore:
+    """LRU of analysed repositories: source key -> {name, source, clone_dir, tech_stack, index, loaded_at, ...}."""
+
+    def __init__(self, max_repos=DEFAULT_MAX_REPOS, **options):
+        self.max_repos = max_repos
+        self.options = options          # passed to pipeline.analyze_repo
+        self._repos = OrderedDict()
+        self._lock = threading.Lock()
+        self._loading = {}              # key -> [lock, users], so one repo is never indexed twice at once
+
+    def keys(self):
+        with self._lock:
+            return list(self._repos)
+
+    def _find(self, ref):
+        # a source (URL or path) or, when it is unambiguous, a bare repository name
+        key = source_key(ref)
+        if key in self._repos:
+            return key
+        matches = [k for k, entry in self._repos.items() if entry["name"] == ref]
+        if len(matches) > 1:
+            raise ApiError(409, f"several loaded repositories are named {ref}: {', '.join(matches)}")
+        return matches[0] if matches else None
+
+    def get(self, ref):
+        with self._lock:
+            key = self._find(ref)
+            if key is None:
+                return None
+            self._repos.move_to_end(key)
+            return self._repos[key]
+
+    def load(self, source, refresh=False):
+        key = source_key(source)
+        with self._lock:
+            slot = self._loading.setdefault(key, [threading.Lock(), 0])
+            slot[1] += 1
+        try:
+            with slot[0]:
+                return self._load(source, key, refresh)
+        finally:
+            # dropped once nobody is loading or waiting for this source
+            with self._lock:
+                slot[1] -= 1
+                if not slot[1]:
+                    del self._loading[key]
+
+    def _load(self, source, key, refresh):
+        from pipeline import analyze_repo
+        with self._lock:
+            entry = None if refresh else self._repos.get(key)
+            if entry is not None:
+                self._repos.move_to_end(key)
+                return entry
+        name = repo_name(source)
+        t = time.perf_counter()
+        clone_dir, clone_status = prepare_source(source)
+        analysis = analyze_repo(clone_dir, checkout_name(source), **self.options)
+        results = analysis["results"]
+        entry = {
+            "name": name,
+            "key": key,
+            "source": source,
+            "clone_dir": clone_dir,
+            "clone": clone_status,
+            "tech_stack": {k: sorted(v) for k, v in results["tech_stack"].items()},
+            "index": results["index"],
+            "setup_guide": results.get("setup_guide"),
+            "itinerary": results.get("itinerary"),
+            "load_seconds": round(time.perf_counter() - t, 4),
+            "loaded_at": time.time(),
+        }
+        with self._lock:
+            self._repos[key] = entry
+            self._repos.move_to_end(key)
+            while len(self._repos) > self.max_repos:
+                self._repos.popitem(last=False)
+        return entry
+
+    def evict(self, ref):
+        with self._lock:
+            key = self._find(ref)
+            return key is not None and self._repos.pop(key, None) is not None
+
+# ---------- queries ----------
+
+def _chapter_view(index, n, with_code):
+    chapters = index["chapters"]
+    if not 1 <= n <= len(chapters):
+        raise ApiError(404, f"chapter {n} out of range 1..{len(chapters)}")
+    ch = chapters[n - 1]
+    functions = []
+    for f in ch["functions"]:
+        item = dict(f)
+        if with_code:
+            item["code"] = function_code(index["lookup"][f["id"]])
+        functions.append(item)
+    return {"chapter": n, "title": ch["title"], "functions": functions}
+
+def find_functions(index, name=None, fid=None, with_code=True):
+    functions = index["functions"]
+    if fid is not None:
+        if not 0 <= fid < len(functions):
+            raise ApiError(404, f"no function with id {fid}")
+        matches = [functions[fid]]
+    else:
+        matches = [f for f in functions if f["name"] == name]
+    out = []
+    for f in matches:
+        item = dict(f)
+        if with_code:
+            item["code"] = function_code(index["lookup"][f["id"]])
+        out.append(item)
+    return out
+
+def search_index(index, query, limit=20):
+    """BM25 matches: top functions and chapters for a free-text query."""
+    search = index.get("search")
+    if search is None:
+        return {"functions": [], "chapters": []}
+    scores = search.scores(query)
+    chapters = index["chapters"]
+    return {
+        "functions": [dict(index["functions"][fid], score=round(score, 4))
+                      for fid, score in search.top_functions(query, limit, scores)],
+        "chapters": [{"chapter": c + 1, "title": chapters[c]["title"], "score": round(score, 4), "matches": hits}
+                     for c, score, hits in search.top_chapters(query, 3, scores)],
+    }
+
+def search_functions(index, query, limit=20):
+    """Name/path match: exact name, then name prefix, then substring of name or file."""
+    q = query.strip().lower()
+    if not q:
+        return []
+    scored = []
+    for f in index["functions"]:
+        name = f["name"].lower()
+        if name == q:
+            rank = 0
+        elif name.startswith(q):
+            rank = 1
+        elif q in name:
+            rank = 2
+        elif q in f["file"].lower():
+            rank = 3
+        else:
+            continue
+        scored.append((rank, len(name), f["id"]))
+    scored.sort()
+    return [dict(index["functions"][fid], rank=rank) for rank, _, fid in scored[:limit]]
+
+# ---------- HTTP ----------
+
+def _param(params, key, default=None, cast=str):
+    values = params.get(key)
+    if not values:
+        if default is None:
+            raise ApiError(400, f"missing parameter: {key}")
+        return default
+    try:
+        return cast(values[0])
+    except ValueError:
+        raise ApiError(400, f"bad value for {key}: {values[0]!r}")
+
+def _flag(value):
+    return str(value).lower() in ("1", "true", "yes")
+
+# clone/read a repository or spend LLM calls: never from a plain GET, which any web page
+# open in the browser can send to 127.0.0.1
+_MUTATING = {"/load", "/reindex", "/evict", "/ask"}
+_LOCAL_HOSTS = {"localhost", "127.0.0.1", "[::1]"}
+
+class _Handler(BaseHTTPRequestHandler):
+    server_version = "git-teach-index/1"
+
+    def log_message(self, fmt, *args):
+        if self.server.verbose:
+            super().log_message(fmt, *args)
+
+    def _send(self, status, payload):
+        body = json.dumps(payload, default=str, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _entry(self, params):
+        store = self.server.store
+        source = params.get("source", [None])[0]
+        if source:
+            return store.load(source)
+        name = _param(params, "repo")
+        entry = store.get(name)
+        if entry is None:
+            raise ApiError(404, f"repository not loaded: {name} (pass source= to load it)")
+        return entry
+
+    def _dispatch(self, params):
+        path = urlparse(self.path).path.rstrip("/") or "/"
+        store = self.server.store
+        t = time.perf_counter()
+        if path == "/health":
+            result = {"status": "ok", "repos": store.keys(), "llm": llm_gateway.get_backend().name}
+        elif path == "/load":
+            entry = store.load(_param(params, "source"), refresh=_flag(params.get("refresh", ["0"])[0]))
+            result = {k: entry[k] for k in ("name", "key", "clone_dir", "clone", "tech_stack", "load_seconds")}
+            result["summary"] = entry["index"]["summary"]
+        elif path == "/reindex":
+            entry = store.load(_param(params, "source"), refresh=True)
+            result = {"name": entry["name"], "key": entry["key"], "load_seconds": entry["load_seconds"], "summary": entry["index"]["summary"]}
+        elif path == "/evict":
+            result = {"evicted": store.evict(_param(params, "repo"))}
+        elif path == "/summary":
+            entry = self._entry(params)
+            result = {"name": entry["name"], "tech_stack": entry["tech_stack"], "summary": entry["index"]["summary"],
+                      "setup_guide": entry["setup_guide"], "itinerary": entry["itinerary"]}
+        elif path == "/chapters":
+            index = self._entry(params)["index"]
+            result = [{"chapter": n, "title": ch["title"], "functions": len(ch["functions"])}
+                      for n, ch in enumerate(index["chapters"], 1)]
+        elif path == "/chapter":
+            index = self._entry(params)["index"]
+            result = _chapter_view(index, _param(params, "n", cast=int), _flag(params.get("code", ["1"])[0]))
+        elif path == "/function":
+            index = self._entry(params)["index"]
+            fid = params.get("id")
+            result = find_functions(index, name=None if fid else _param(params, "name"),
+                                    fid=_param(params, "id", cast=int) if fid else None,
+                                    with_code=_flag(params.get("code", ["1"])[0]))
+            if not result:
+                raise ApiError(404, "no such function")
+        elif path == "/search":
+            index = self._entry(params)["index"]
+            query, limit = _param(params, "q"), _param(params, "limit", 20, int)
+            if _param(params, "mode", "bm25") == "name":
+                result = search_functions(index, query, limit=limit)
+            else:
+                result = search_index(index, query, limit=limit)
+        elif path == "/ask":
+            if llm_gateway.get_backend().name == "local":
+                raise ApiError(400, "/ask is disabled in local-only mode")
+            index = self._entry(params)["index"]
+            chapter = _param(params, "chapter", 0, int)
+            budget = _param(params, "budget", DEFAULT_TOKEN_BUDGET, int)
+            question = _param(params, "q")
+            context, used = pack_context(index, chapter=chapter - 1 if chapter else None, budget=budget, question=question)
+            result = {"answer": llm_gateway.generate(question + "\n" + context), "context_tokens": used}
+        else:
+            raise ApiError(404, f"unknown endpoint: {path}")
+        return {"result": result, "ms": round((time.perf_counter() - t) * 1000, 3)}
+
+    def _handle(self, params):
+        try:
+            self._send(200, self._dispatch(params))
+        except ApiError as e:
+            self._send(e.status, {"error": str(e)})
+        except Exception as e:
+            self._send(500, {"error": f"{e.__class__.__name__}: {e}"})
+
+    def _host_allowed(self):
+        # a DNS-rebinding page reaches us under its own host name
+        host = (self.headers.get("Host") or "").lower()
+        if not host.endswith("]"):
+            host = host.rsplit(":", 1)[0]
+        return host in _LOCAL_HOSTS or host == self.server.server_address[0]
+
+    def do_GET(self):
+        if not self._host_allowed():
+            self._send(403, {"error": "only localhost Host headers are accepted"})
+            return
+        params = parse_qs(urlparse(self.path).query)
+        if urlparse(self.path).path.rstrip("/") in _MUTATING or "source" in params:
+            self._send(405, {"error": "loading a repository or asking needs a POST with a JSON body"})
+            return
+        self._handle(params)
+
+    def do_POST(self):
+        if not self._host_allowed():
+            self._send(403, {"error": "only localhost Host headers are accepted"})
+            return
+        if self.headers.get_content_type() != "application/json":
+            # a cross-site form or no-cors fetch cannot send this content type without a preflight
+            self._send(415, {"error": "POST bodies must be application/json"})
+            return
+        length = int(self.headers.get("Content-Length") or 0)
+        try:
+            body = json.loads(self.rfile.read(length) or b"{}")
+        except json.JSONDecodeError:
+            self._send(400, {"error": "body is not JSON"})
+            return
+        params = parse_qs(urlparse(self.path).query)
+        params.update({k: [v if isinstance(v, str) else json.dumps(v)] for k, v in body.items()})
+        self._handle(params)
+
+def make_server(host=DEFAULT_HOST, port=DEFAULT_PORT, max_repos=DEFAULT_MAX_REPOS, verbose=False, **options):
+    """A ThreadingHTTPServer with an IndexStore attached; call serve_forever() on it."""
+    server = ThreadingHTTPServer((host, port), _Handler)
+    server.daemon_threads = True
+    server.store = IndexStore(max_repos=max_repos, **options)
+    server.verbose = verbose
+    return server
+
+# ---------- thin client ----------
+
+def request(endpoint, host=DEFAULT_HOST, port=DEFAULT_PORT, timeout=600, **params):
+    """POST params to a running daemon; returns the decoded result or raises RuntimeError."""
+    data = json.dumps({k: v for k, v in params.items() if v is not None}).encode("utf-8")
+    req = Request(f"http://{host}:{port}/{endpoint.lstrip('/')}", data=data,
+                  headers={"Content-Type": "application/json"}, method="POST")
+    try:
+        with urlopen(req, timeout=timeout) as resp:
+            return json.loads(resp.read())["result"]
+    except HTTPError as e:
+        try:
+            message = json.loads(e.read()).get("error", str(e))
+        except ValueError:
+            message = str(e)
+        raise RuntimeError(message) from None
@@ -0,0 +1,71 @@
+import os
+
+# Guards for reading repository files: cheap binary sniffing from the first bytes,
+# per-file and total byte budgets, an encoding fallback, and streaming line reads.
+# Anything rejected is reported as (path, reason) instead of stalling or crashing a run.
+
+SNIFF_BYTES = 8192
+DEFAULT_MAX_FILE_BYTES = 1 * 1024 * 1024        # bundled vendor files are usually far above this
+DEFAULT_MAX_TOTAL_BYTES = 256 * 1024 * 1024
+FALLBACK_ENCODING = "latin-1"                    # never fails; 1 byte == 1 char
+
+def sniff(path: str) -> str:
+    """None if the file looks like text, else the reason to skip it."""
+    try:
+        with open(path, "rb") as fh:
+            head = fh.read(SNIFF_BYTES)
+    except OSError as e:
+        return f"unreadable ({e.__class__.__name__})"
+    if b"\0" in head:
+        return "binary"
+    # a high share of control bytes is another strong binary signal
+    control = sum(1 for b in head if b < 32 and b not in (9, 10, 12, 13, 27))
+    if head and control / len(head) > 0.10:
+        return "binary"
+    return None
+
+def plan_ingestion(paths, max_file_bytes=DEFAULT_MAX_FILE_BYTES, max_total_bytes=DEFAULT_MAX_TOTAL_BYTES):
+    """Split paths into (accepted, skipped). skipped is a list of (path, reason)."""
+    accepted, skipped = [], []
+    total = 0
+    for path in paths:
+        try:
+            size = os.path.getsize(path)
+        except OSError:
+            skipped.append((path, "missing"))
+            continue
+        if max_file_bytes is not None and size > max_file_bytes:
+            skipped.append((path, f"too large ({size} bytes > {max_file_bytes})"))
+            continue
+        reason = sniff(path)
+        if reason:
+            skipped.append((path, reason))
+            continue
+        if max_total_bytes is not None and total + size > max_total_bytes:
+            skipped.append((path, "total byte budget exhausted"))
+            continue
+        total += size
+        accepted.append(path)
+    return accepted, skipped
+
+def decode_bytes(data: bytes):
+    """(text, encoding): utf-8 (BOM stripped) when valid, else the latin-1 fallback."""
+    try:
+        if data.startswith(b"\xef\xbb\xbf"):
+            return data[3:].decode("utf-8"), "utf-8-sig"
+        return data.decode("utf-8"), "utf-8"
+    except UnicodeDecodeError:
+        return data.decode(FALLBACK_ENCODING), FALLBACK_ENCODING
+
+def iter_lines(path: str, max_bytes=DEFAULT_MAX_FILE_BYTES):
+    """Stream text lines without loading the file; stops after max_bytes. Bad bytes are replaced."""
+    read = 0
+    try:
+        with open(path, "r", encoding="utf-8", errors="replace") as fh:
+            for line in fh:
+                read += len(line)
+                if max_bytes is not None and read > max_bytes:
+                    return
+                yield line
+    except OSError:
+        return
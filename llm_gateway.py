@@ -0,0 +1,173 @@
+import os, re, time, hashlib, sqlite3, threading
+
+import tracing
+
+# One place for every generate_content call.
+#   - a single client per process (built lazily on first use)
+#   - persistent response cache keyed by sha256(model + prompt), LRU-evicted and TTL-bounded
+#   - pluggable backends: "gemini" (default) or "stub" for offline, deterministic runs
+#   - "local" backend for --local-only runs: refuses every call, never imports the SDK
+# Select the backend with configure(backend=...) or the GIT_TEACH_LLM env var.
+
+DEFAULT_MODEL = "gemini-2.5-flash"
+DEFAULT_CACHE_PATH = os.path.join("cloned_repos", ".llm_cache.sqlite3")
+DEFAULT_MAX_ENTRIES = 2000
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+DEFAULT_TTL = 7 * 24 * 3600
+
+class GeminiBackend:
+    name = "gemini"
+
+    def __init__(self):
+        self._client = None
+        self._lock = threading.Lock()
+
+    def _get_client(self):
+        with self._lock:
+            if self._client is None:
+                from google import genai
+                from google.genai.types import HttpOptions
+                self._client = genai.Client(http_options=HttpOptions(api_version="v1"))
+            return self._client
+
+    def generate(self, model: str, prompt: str) -> str:
+        response = self._get_client().models.generate_content(model=model, contents=prompt)
+        return str(response.text)
+
+_RE_QUOTED_PATH = re.compile(r"'([^'\n]+\.[A-Za-z0-9]+)'")
+
+class StubBackend:
+    """Offline backend: the same prompt always gives the same answer, no network."""
+    name = "stub"
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+
+    def generate(self, model: str, prompt: str) -> str:
+        if self.latency:
+            time.sleep(self.latency)
+        digest = hashlib.sha256(prompt.encode("utf-8")).hexdigest()[:8]
+        if "Python list" in prompt:
+            # file-selection prompt: echo back up to 10 of the listed paths
+            paths = _RE_QUOTED_PATH.findall(prompt)
+            return repr(paths[:10])
+        first = next((ln.strip() for ln in prompt.splitlines() if ln.strip()), "")
+        return f"[stub {digest}] {first[:80]}"
+
+class LocalOnlyBackend:
+    """--local-only: any LLM call is a bug, and the SDK is never imported."""
+    name = "local"
+
+    def generate(self, model: str, prompt: str) -> str:
+        raise RuntimeError("LLM call attempted in local-only mode")
+
+BACKENDS = {"gemini": GeminiBackend, "stub": StubBackend, "local": LocalOnlyBackend}
+
+class ResponseCache:
+    """sqlite-backed LRU with TTL. Safe to share between threads and processes."""
+
+    def __init__(self, path=DEFAULT_CACHE_PATH, max_entries=DEFAULT_MAX_ENTRIES,
+                 max_bytes=DEFAULT_MAX_BYTES, ttl=DEFAULT_TTL):
+        self.path = path
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._db = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            " key TEXT PRIMARY KEY, response TEXT, size INTEGER,"
+            " created REAL, last_used REAL)")
+        self._db.commit()
+
+    @staticmethod
+    def key(model: str, prompt: str) -> str:
+        return hashlib.sha256(f"{model}\0{prompt}".encode("utf-8")).hexdigest()
+
+    def get(self, key: str):
+        now = time.time()
+        with self._lock:
+            row = self._db.execute("SELECT response, created FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None or now - row[1] > self.ttl:
+                if row is not None:
+                    self._db.execute("DELETE FROM responses WHERE key = ?", (key,))
+                    self._db.commit()
+                self.misses += 1
+                return None
+            self._db.execute("UPDATE responses SET last_used = ? WHERE key = ?", (now, key))
+            self._db.commit()
+            self.hits += 1
+            return row[0]
+
+    def put(self, key: str, response: str):
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO responses (key, response, size, created, last_used) VALUES (?, ?, ?, ?, ?)",
+                (key, response, len(response.encode("utf-8")), now, now))
+            self._evict(now)
+            self._db.commit()
+
+    def _evict(self, now):
+        self._db.execute("DELETE FROM responses WHERE created < ?", (now - self.ttl,))
+        count, total = self._db.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses").fetchone()
+        if count <= self.max_entries and total <= self.max_bytes:
+            return
+        # least recently used first
+        drop = []
+        for key, size in self._db.execute("SELECT key, size FROM responses ORDER BY last_used ASC"):
+            if count <= self.max_entries and total <= self.max_bytes:
+                break
+            drop.append((key,))
+            count -= 1
+            total -= size
+        self._db.executemany("DELETE FROM responses WHERE key = ?", drop)
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+_backend = None
+_cache = None
+
+def configure(backend=None, cache_path=DEFAULT_CACHE_PATH, use_cache=True, **cache_options):
+    """Pick the backend ("gemini"/"stub" or an object with .generate(model, prompt)) and cache settings."""
+    global _backend, _cache
+    if backend is None:
+        backend = os.environ.get("GIT_TEACH_LLM", "gemini")
+    _backend = BACKENDS[backend]() if isinstance(backend, str) else backend
+    if _cache is not None:
+        _cache.close()
+    _cache = ResponseCache(cache_path, **cache_options) if use_cache else None
+
+def get_backend():
+    if _backend is None:
+        configure()
+    return _backend
+
+def cache_stats():
+    if _cache is None:
+        return {"hits": 0, "misses": 0}
+    return {"hits": _cache.hits, "misses": _cache.misses}
+
+def generate(prompt: str, model: str = DEFAULT_MODEL) -> str:
+    backend = get_backend()
+    with tracing.span("llm.generate", cat="llm", model=model, backend=getattr(backend, "name", "custom"),
+                      prompt_chars=len(prompt)) as sp:
+        # stub answers are free and would poison the real cache, so they skip it
+        if _cache is None or getattr(backend, "name", "") in ("stub", "local"):
+            text = backend.generate(model, prompt)
+            sp.set(cached=False, response_chars=len(text))
+            return text
+        key = ResponseCache.key(model, prompt)
+        cached = _cache.get(key)
+        if cached is not None:
+            sp.set(cached=True, response_chars=len(cached))
+            return cached
+        text = backend.generate(model, prompt)
+        _cache.put(key, text)
+        sp.set(cached=False, response_chars=len(text))
+        return text
@@ -1,68 +1,220 @@
-import os
-import git
+from typing import List
+
 import typer
 
-from deterministic_setup import detect_tech_stack, generate_setup_guide, filter_boilerplate_files
-from chunking import *
+from context_packer import DEFAULT_TOKEN_BUDGET
+from ingest import DEFAULT_MAX_FILE_BYTES, DEFAULT_MAX_TOTAL_BYTES
 
-from google import genai
-from google.genai.types import HttpOptions
+# Only the light modules are imported at startup so `--help` stays fast; the pipeline,
+# GitPython and the LLM SDK load inside the command that needs them.
 
 app = typer.Typer()
 
 @app.command()
-def fetch_repo(repo_url: str, skill_level: str = typer.Option("beginner", help="Skill level: beginner/intermediate/advanced")):
-    repo_name = repo_url.rstrip("/").split("/")[-1]
-    clone_dir = f"./cloned_repos/{repo_name}"
+def fetch_repo(repo_url: str, skill_level: str = typer.Option("beginner", help="Skill level: beginner/intermediate/advanced"),
+               workers: int = typer.Option(1, help="Processes used to index files (1 = no pool)"),
+               llm: str = typer.Option(None, help="LLM backend: gemini/stub (stub is offline and deterministic); defaults to $GIT_TEACH_LLM or gemini"),
+               llm_cache: bool = typer.Option(True, help="Reuse cached LLM responses for identical prompts"),
+               token_budget: int = typer.Option(DEFAULT_TOKEN_BUDGET, help="Max context tokens sent with each chapter question"),
+               partition: str = typer.Option("components", help="Chapter partitioning: components/labels"),
+               max_chapter_size: int = typer.Option(None, help="Max functions per chapter (labels partitioning)"),
+               depth: int = typer.Option(None, help="Shallow clone with this history depth (e.g. 1)"),
+               partial: bool = typer.Option(False, help="Partial clone without blobs (--filter=blob:none)"),
+               sparse: List[str] = typer.Option(None, help="Sparse checkout of these directories (repeatable)"),
+               update: bool = typer.Option(True, help="Fetch and fast-forward an existing checkout"),
+               trace: str = typer.Option(None, help="Write a Chrome trace-event JSON of every stage and LLM call here"),
+               profile_index: str = typer.Option(None, help="Dump cProfile stats of the indexing stage here"),
+               max_file_bytes: int = typer.Option(DEFAULT_MAX_FILE_BYTES, help="Skip files larger than this when indexing"),
+               max_total_bytes: int = typer.Option(DEFAULT_MAX_TOTAL_BYTES, help="Stop indexing files after this many bytes in total"),
+               local_only: bool = typer.Option(False, help="No LLM at all: local file ranking, no setup guide or itinerary, chapters shown as code"),
+               prefetch: int = typer.Option(2, help="Chapters explained ahead in the background while you read (0 = off)")):
+    from pipeline import analyze_repo
+    from git_sync import sync_repo
+    from batch import CLONE_ROOT, checkout_name
+    from context_packer import pack_context, chapter_prompt, requested_chapter, is_navigation
+    from prefetch import ChapterPrefetcher
+    from code_reader import function_code
+    import llm_gateway
+    import tracing
 
+    llm_gateway.configure(backend="local" if local_only else llm, use_cache=llm_cache and not local_only)
+    if trace:
+        tracing.enable()
 
-    if os.path.exists(clone_dir):
-        typer.echo(f"Repository {repo_name} already exists in {clone_dir}. Skipping cloning...")
-    else:
-        typer.echo(f"Cloning repository {repo_url} into {clone_dir}...")
-        git.Repo.clone_from(repo_url, clone_dir)
-
-        typer.echo(f"Skill level set to {skill_level}.")
-        typer.echo(f"Repository {repo_name} cloned successfully into {clone_dir}.")
-    
-    typer.echo("\nAnalyzing tech stack...")
-    tech_stack = detect_tech_stack(clone_dir)
-    typer.echo(f"Detected Tech Stack: {tech_stack}")
-
-    typer.echo("\n Filtering boilerplate code...")
-    filtered_code = filter_boilerplate_files(clone_dir)
-    # typer.echo(f"Found {len(filtered_code)} relevant files.")
-    typer.echo(f"The relevant files are: {filtered_code}")
-
-    typer.echo("\nGenerating setup guide...")
-    setup_guide = generate_setup_guide(tech_stack)
-    typer.echo(f"\n=== Setup Guide ===\n{setup_guide}")
-
-    files = retrieve_file_list(filtered_code)
-    chapter_guide = index_repository(files)
+    repo_name = checkout_name(repo_url)
+    clone_dir = f"{CLONE_ROOT}/{repo_name}"
+
+
+    with tracing.span("clone", source=repo_url) as sp:
+        sp.set(status=sync_repo(repo_url, clone_dir, depth=depth, blob_filter="blob:none" if partial else None,
+                                sparse_paths=sparse or None, update=update, echo=typer.echo))
+    typer.echo(f"Skill level set to {skill_level}.")
+
+    typer.echo("\nAnalyzing repository (scan, tech stack, file filter, setup guide, index)...")
+    analysis = analyze_repo(clone_dir, repo_name, workers=workers, token_budget=token_budget,
+                            partition=partition, max_chapter_size=max_chapter_size,
+                            profile_index=profile_index, max_file_bytes=max_file_bytes,
+                            max_total_bytes=max_total_bytes, local_only=local_only)
+    results = analysis["results"]
+
+    typer.echo(f"Found {len(results['scan'])} files.")
+    typer.echo(f"Detected Tech Stack: {results['tech_stack']}")
+    typer.echo(f"The relevant files are: {results['relevant_files']}")
+    if not local_only:
+        typer.echo(f"\n=== Setup Guide ===\n{results['setup_guide']}")
+
+    chapter_guide = results["index"]
     typer.echo(f"Summary: {chapter_guide['summary']}")
+    cache_stats = chapter_guide["summary"]["cache"]
+    typer.echo(f"Index cache: {cache_stats['hits']} hits, {cache_stats['misses']} misses")
+    for skipped in chapter_guide["summary"]["skipped"]:
+        typer.echo(f"  skipped {skipped['file']}: {skipped['reason']}")
 
-    question = f"""
-Given this chapter list (JSON), propose a high-level chapter itinerary with 1-line summaries per chapter. 
-You do not need to conform to this chapter list - you may combine functions where logical.
-Do not invent code beyond what’s referenced. Return a numbered list. 
-{chapter_guide}
-"""
-    client = genai.Client(http_options=HttpOptions(api_version="v1"))
-    response = client.models.generate_content(
-        model="gemini-2.5-flash",
-        contents=question,
-    )
-
-    typer.echo(response.text)
+    if not local_only:
+        typer.echo(results["itinerary"])
+    for name, t in sorted(analysis["timings"].items(), key=lambda kv: kv[1]["start"]):
+        typer.echo(f"  {name:<15} {t['start']:7.2f}s -> {t['end']:7.2f}s ({t['duration']:.2f}s)")
+    typer.echo(f"Critical path: {' -> '.join(analysis['critical_path'])} ({analysis['wall_time']:.2f}s)")
+    if trace:
+        tracing.write_chrome_trace(trace)
+        typer.echo(f"Trace written to {trace}")
+
+    chapter_count = len(chapter_guide["chapters"])
+    current = -1
+    prefetcher = None
+    if prefetch > 0 and not local_only and chapter_count:
+        prefetcher = ChapterPrefetcher(
+            lambda c: chapter_prompt(chapter_guide, c, budget=token_budget, skill_level=skill_level), depth=prefetch)
+        prefetcher.schedule(current, chapter_count)
     next_question = typer.prompt("Ready to start?")
     while next_question != "exit":
+        current = requested_chapter(next_question, current, chapter_count)
+        if local_only:
+            if chapter_count:
+                chapter = chapter_guide["chapters"][current]
+                typer.echo(f"\n=== Chapter {current + 1}/{chapter_count}: {chapter['title']} ===")
+                for f in chapter["functions"]:
+                    typer.echo(f"\n--- {f['file']}:{f['start_line']} {f['name']} ---")
+                    typer.echo(function_code(chapter_guide["lookup"][f["id"]]))
+            next_question = typer.prompt("Ready?")
+            continue
+        if is_navigation(next_question):
+            # the chapter explanation: usually already generated in the background
+            if prefetcher:
+                answer, used = prefetcher.get(current)
+                prefetcher.schedule(current, chapter_count)
+            else:
+                prompt, used = chapter_prompt(chapter_guide, current, budget=token_budget, skill_level=skill_level)
+                answer = llm_gateway.generate(prompt)
+            typer.echo(answer)
+        else:
+            # a question gets the functions retrieved for it
+            context, used = pack_context(chapter_guide, chapter=current, budget=token_budget, question=next_question)
+            typer.echo(llm_gateway.generate(next_question + "\n" + context))
+        typer.echo(f"[chapter {current + 1}/{chapter_count}, ~{used} context tokens]")
         next_question = typer.prompt("Ready?")
-        new_response = client.models.generate_content(
-        model="gemini-2.5-flash",
-        contents=(next_question + f"{chapter_guide}"),
-    )
-        typer.echo(new_response.text)
+    if prefetcher:
+        prefetcher.close()
+        typer.echo(prefetcher.summary())
+    stats = llm_gateway.cache_stats()
+    if not local_only:
+        typer.echo(f"LLM cache: {stats['hits']} hits, {stats['misses']} misses")
+    if trace:
+        # again, now including the chapter turns
+        tracing.write_chrome_trace(trace)
+
+@app.command()
+def fetch_many(sources_file: str = typer.Argument(..., help="File with one repo URL or local path per line"),
+               out: str = typer.Option("-", help="JSONL output file ('-' = stdout)"),
+               jobs: int = typer.Option(2, help="Repositories analysed in parallel (one process each)"),
+               timeout: float = typer.Option(600.0, help="Seconds before a repository's process is killed (0 = no limit)"),
+               workers: int = typer.Option(1, help="Processes used to index files within each repository"),
+               llm: str = typer.Option(None, help="LLM backend: gemini/stub; defaults to $GIT_TEACH_LLM or gemini"),
+               llm_cache: bool = typer.Option(True, help="Reuse cached LLM responses for identical prompts"),
+               local_only: bool = typer.Option(False, help="No LLM at all: no setup guide or itinerary"),
+               token_budget: int = typer.Option(DEFAULT_TOKEN_BUDGET, help="Max context tokens for the itinerary prompt"),
+               partition: str = typer.Option("components", help="Chapter partitioning: components/labels"),
+               max_chapter_size: int = typer.Option(None, help="Max functions per chapter (labels partitioning)"),
+               depth: int = typer.Option(None, help="Shallow clone with this history depth (e.g. 1)"),
+               partial: bool = typer.Option(False, help="Partial clone without blobs (--filter=blob:none)"),
+               max_file_bytes: int = typer.Option(DEFAULT_MAX_FILE_BYTES, help="Skip files larger than this when indexing"),
+               max_total_bytes: int = typer.Option(DEFAULT_MAX_TOTAL_BYTES, help="Stop indexing files after this many bytes in total")):
+    """Analyse many repositories without prompting and stream one JSON record per repository."""
+    import sys
+    from batch import read_sources, run_batch, write_jsonl
+
+    sources = read_sources(sources_file)
+    records = run_batch(sources, jobs=jobs, timeout=timeout or None, depth=depth,
+                        blob_filter="blob:none" if partial else None, llm=llm, llm_cache=llm_cache,
+                        local_only=local_only, workers=workers, token_budget=token_budget,
+                        partition=partition, max_chapter_size=max_chapter_size,
+                        max_file_bytes=max_file_bytes, max_total_bytes=max_total_bytes)
+    if out == "-":
+        counts = write_jsonl(records, sys.stdout)
+    else:
+        with open(out, "w", encoding="utf-8") as fh:
+            counts = write_jsonl(records, fh)
+    typer.echo(f"{len(sources)} repositories: " + ", ".join(f"{n} {status}" for status, n in sorted(counts.items())), err=True)
+    if counts.get("error") or counts.get("timeout"):
+        raise typer.Exit(code=1)
+
+@app.command()
+def serve(host: str = typer.Option("127.0.0.1", help="Address to bind (keep it local)"),
+          port: int = typer.Option(8765, help="Port to listen on"),
+          max_repos: int = typer.Option(8, help="Indexed repositories kept in memory (LRU)"),
+          workers: int = typer.Option(1, help="Processes used to index files"),
+          llm: str = typer.Option(None, help="LLM backend: gemini/stub; defaults to $GIT_TEACH_LLM or gemini"),
+          llm_cache: bool = typer.Option(True, help="Reuse cached LLM responses for identical prompts"),
+          local_only: bool = typer.Option(False, help="No LLM at all: no setup guide, itinerary or /ask"),
+          partition: str = typer.Option("components", help="Chapter partitioning: components/labels"),
+          max_chapter_size: int = typer.Option(None, help="Max functions per chapter (labels partitioning)"),
+          verbose: bool = typer.Option(False, help="Log every request")):
+    """Keep repository indexes warm in a local daemon; query it with `query`."""
+    import llm_gateway
+    from index_server import make_server
+
+    llm_gateway.configure(backend="local" if local_only else llm, use_cache=llm_cache and not local_only)
+    server = make_server(host, port, max_repos=max_repos, verbose=verbose, workers=workers,
+                         local_only=local_only, partition=partition, max_chapter_size=max_chapter_size)
+    typer.echo(f"Serving on http://{host}:{port} (llm: {llm_gateway.get_backend().name}); Ctrl-C to stop")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+@app.command()
+def query(action: str = typer.Argument(..., help="health/load/reindex/summary/chapters/chapter/function/search/ask/evict"),
+          source: str = typer.Argument(None, help="Repo URL or local path (loaded on first use)"),
+          arg: str = typer.Argument(None, help="Chapter number, function name, search text or question"),
+          chapter: int = typer.Option(None, help="Chapter the question is about (ask)"),
+          host: str = typer.Option("127.0.0.1", help="Daemon address"),
+          port: int = typer.Option(8765, help="Daemon port")):
+    """Thin client for a running `serve` daemon; prints the JSON result."""
+    import json
+    from index_server import request
+
+    params = {"source": source}
+    if action == "chapter":
+        params["n"] = arg
+    elif action == "function":
+        params["name"] = arg
+    elif action == "search":
+        params["q"] = arg
+    elif action == "ask":
+        params.update(q=arg, chapter=chapter)
+    elif action == "evict":
+        if not source:
+            typer.echo("error: evict needs the repository source (or its name)", err=True)
+            raise typer.Exit(code=1)
+        params = {"repo": source}
+    try:
+        result = request(action, host=host, port=port, **params)
+    except (RuntimeError, OSError) as e:
+        typer.echo(f"error: {e}", err=True)
+        raise typer.Exit(code=1)
+    typer.echo(json.dumps(result, indent=2, ensure_ascii=False))
 
 if __name__ == "__main__":
     app()
@@ -0,0 +1,150 @@
+import os, time, cProfile
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from Deterministic_Setup import detect_tech_stack, generate_setup_guide, filter_boilerplate_files, rank_files, DEFAULT_RANK_POOL
+from chunking import retrieve_file_list, index_repository, call_in_degrees
+from repo_scan import scan_repository
+from context_packer import pack_context, DEFAULT_TOKEN_BUDGET
+from ingest import DEFAULT_MAX_FILE_BYTES, DEFAULT_MAX_TOTAL_BYTES
+import llm_gateway
+import tracing
+
+# ---------- stage scheduler ----------
+# A stage is {"name", "fn", "deps"}; fn is called with one keyword argument per dependency.
+# Stages start as soon as their dependencies finish, so LLM round-trips and local work overlap.
+
+def stage(name, fn, deps=()):
+    return {"name": name, "fn": fn, "deps": list(deps)}
+
+def run_stages(stages, max_workers=4):
+    """Run a stage DAG on a thread pool. Returns (results, timings) keyed by stage name."""
+    by_name = {s["name"]: s for s in stages}
+    for s in stages:
+        for d in s["deps"]:
+            if d not in by_name:
+                raise ValueError(f"stage {s['name']!r} depends on unknown stage {d!r}")
+
+    results, timings = {}, {}
+    pending = list(stages)
+    running = {}
+    t0 = time.perf_counter()
+
+    def timed(s, kwargs):
+        start = time.perf_counter()
+        try:
+            with tracing.span(s["name"]):
+                return s["fn"](**kwargs)
+        finally:
+            timings[s["name"]] = {"start": start - t0, "end": time.perf_counter() - t0}
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        while pending or running:
+            for s in [s for s in pending if all(d in results for d in s["deps"])]:
+                pending.remove(s)
+                kwargs = {d: results[d] for d in s["deps"]}
+                running[pool.submit(timed, s, kwargs)] = s["name"]
+            if not running:
+                raise ValueError(f"dependency cycle between stages: {[s['name'] for s in pending]}")
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for fut in done:
+                name = running.pop(fut)
+                try:
+                    results[name] = fut.result()
+                except Exception:
+                    for other in running:
+                        other.cancel()
+                    raise
+
+    for name, t in timings.items():
+        t["duration"] = t["end"] - t["start"]
+    return results, timings
+
+def critical_path(stages, timings):
+    """Chain of stages that determined the wall-clock time, plus that time."""
+    if not timings:
+        return [], 0.0
+    deps = {s["name"]: s["deps"] for s in stages}
+    node = max(timings, key=lambda n: timings[n]["end"])
+    path = [node]
+    while deps[node]:
+        node = max(deps[node], key=lambda n: timings[n]["end"])
+        path.append(node)
+    path.reverse()
+    return path, timings[path[-1]]["end"]
+
+# ---------- fetch_repo stages ----------
+
+def itinerary_prompt(chapter_guide, token_budget=DEFAULT_TOKEN_BUDGET):
+    outline, _ = pack_context(chapter_guide, budget=token_budget)
+    return f"""
+Given this chapter list (JSON), propose a high-level chapter itinerary with 1-line summaries per chapter.
+You do not need to conform to this chapter list - you may combine functions where logical.
+Do not invent code beyond what’s referenced. Return a numbered list.
+{outline}
+"""
+
+def fetch_repo_stages(clone_dir, repo_name, workers=1, token_budget=DEFAULT_TOKEN_BUDGET,
+                      partition="components", max_chapter_size=None, profile_index=None,
+                      max_file_bytes=DEFAULT_MAX_FILE_BYTES, max_total_bytes=DEFAULT_MAX_TOTAL_BYTES,
+                      local_only=False, rank_pool=DEFAULT_RANK_POOL):
+    """
+    scan ─┬─ tech_stack ── setup_guide
+          └─ call_graph ── relevant_files ── index ── itinerary
+    setup_guide only needs the tech stack, so it overlaps with filtering and indexing.
+    call_graph resolves calls among the rank_pool best-scoring files so the file ranker can
+    use in-degrees; it fills the index cache, so the index stage after it is mostly cache hits.
+    profile_index: if set, cProfile stats of the index stage are dumped to this path.
+    local_only: no LLM stages at all; key files are picked locally.
+    """
+    cache_path = os.path.join("./cloned_repos", ".index_cache", f"{repo_name}.json")
+
+    def index(relevant_files):
+        files = retrieve_file_list(relevant_files) or []
+        profiler = cProfile.Profile() if profile_index else None
+        if profiler:
+            profiler.enable()
+        try:
+            return index_repository(files, workers=workers, cache_path=cache_path,
+                                    partition=partition, max_chapter_size=max_chapter_size,
+                                    max_file_bytes=max_file_bytes, max_total_bytes=max_total_bytes)
+        finally:
+            if profiler:
+                profiler.disable()
+                profiler.dump_stats(profile_index)
+
+    def call_graph(scan):
+        # extraction + call resolution only; {file: callers} for the file ranker
+        pool = [e["path"] for _, e in rank_files(scan, limit=rank_pool)]
+        return call_in_degrees(pool, workers=workers, cache_path=cache_path,
+                               max_file_bytes=max_file_bytes, max_total_bytes=max_total_bytes)
+
+    def scan():
+        with tracing.span("scan.walk") as sp:
+            manifest = scan_repository(clone_dir)
+            sp.set(files=len(manifest))
+        return manifest
+
+    stages = [
+        stage("scan", scan),
+        stage("tech_stack", lambda scan: detect_tech_stack(clone_dir, manifest=scan), ["scan"]),
+        stage("call_graph", call_graph, ["scan"]),
+        stage("relevant_files", lambda scan, call_graph: filter_boilerplate_files(
+            clone_dir, manifest=scan, local_only=local_only, in_degree=call_graph), ["scan", "call_graph"]),
+        stage("index", index, ["relevant_files"]),
+    ]
+    if not local_only:
+        stages += [
+            stage("setup_guide", lambda tech_stack: generate_setup_guide(tech_stack), ["tech_stack"]),
+            stage("itinerary", lambda index: llm_gateway.generate(itinerary_prompt(index, token_budget)), ["index"]),
+        ]
+    return stages
+
+def analyze_repo(clone_dir, repo_name, max_workers=4, **options):
+    """
+    Run every non-interactive fetch_repo stage; returns results, timings and the critical path.
+    options are passed to fetch_repo_stages (workers, token_budget, partition, local_only, ...).
+    """
+    stages = fetch_repo_stages(clone_dir, repo_name, **options)
+    results, timings = run_stages(stages, max_workers=max_workers)
+    path, wall = critical_path(stages, timings)
+    return {"results": results, "timings": timings, "critical_path": path, "wall_time": wall}
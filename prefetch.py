@@ -0,0 +1,109 @@
+import time, threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import llm_gateway
+
+# While the user reads chapter N, generate the explanations for N+1 (and N+2) on a single
+# background thread; the chapter order is fixed by index_repository, so "next" is a good
+# guess. Jumping elsewhere cancels whatever has not started yet. Finished answers are kept
+# in a small bounded cache, so going back one chapter is free too.
+
+DEFAULT_DEPTH = 2
+DEFAULT_MAX_CACHED = 4
+
+class ChapterPrefetcher:
+    def __init__(self, make_prompt, depth=DEFAULT_DEPTH, max_cached=DEFAULT_MAX_CACHED, generate=None):
+        """
+        make_prompt(chapter) -> (prompt text, context tokens); the token count is kept with
+        the answer so a hit never rebuilds the prompt. generate defaults to llm_gateway.generate.
+        """
+        self.make_prompt = make_prompt
+        self.depth = depth
+        self.max_cached = max(max_cached, depth)
+        self.generate = generate or llm_gateway.generate
+        self._pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="prefetch")
+        self._jobs = OrderedDict()     # chapter -> {"future", "started", "seconds", "used"}
+        self._lock = threading.Lock()
+        self.stats = {"requests": 0, "hits": 0, "partial_hits": 0, "misses": 0,
+                      "cancelled": 0, "seconds_saved": 0.0}
+
+    def _run(self, chapter, job):
+        job["started"] = time.perf_counter()
+        prompt, job["used"] = self.make_prompt(chapter)
+        text = self.generate(prompt)
+        job["seconds"] = time.perf_counter() - job["started"]
+        return text
+
+    def schedule(self, current, count):
+        """Queue chapters current+1 .. current+depth; cancel queued work outside that window."""
+        wanted = [c for c in range(current + 1, current + 1 + self.depth) if c < count]
+        with self._lock:
+            for chapter, job in list(self._jobs.items()):
+                if chapter not in wanted and job["future"].cancel():
+                    del self._jobs[chapter]
+                    self.stats["cancelled"] += 1
+            for chapter in wanted:
+                if chapter not in self._jobs:
+                    job = {"started": None, "seconds": None, "used": None}
+                    job["future"] = self._pool.submit(self._run, chapter, job)
+                    self._jobs[chapter] = job
+            # bounded: drop the oldest finished answers first
+            for chapter in list(self._jobs):
+                if len(self._jobs) <= self.max_cached:
+                    break
+                if chapter not in wanted and self._jobs[chapter]["future"].done():
+                    del self._jobs[chapter]
+
+    def get(self, chapter):
+        """(explanation, context tokens) for `chapter`: from the prefetch cache when possible, else generated now."""
+        with self._lock:
+            self.stats["requests"] += 1
+            job = self._jobs.get(chapter)
+            if job is not None and not job["future"].done() and job["started"] is None and job["future"].cancel():
+                # still queued behind other work: generating it here is quicker than waiting
+                del self._jobs[chapter]
+                self.stats["cancelled"] += 1
+                job = None
+        if job is None:
+            with self._lock:
+                self.stats["misses"] += 1
+                # the user jumped: anything still queued was for the old position
+                for other, queued in list(self._jobs.items()):
+                    if queued["future"].cancel():
+                        del self._jobs[other]
+                        self.stats["cancelled"] += 1
+            return self._generate_now(chapter)
+
+        done = job["future"].done()
+        waited = time.perf_counter()
+        try:
+            text = job["future"].result()
+        except Exception:
+            with self._lock:
+                self._jobs.pop(chapter, None)
+                self.stats["misses"] += 1
+            return self._generate_now(chapter)
+        waited = time.perf_counter() - waited
+        with self._lock:
+            self.stats["hits" if done else "partial_hits"] += 1
+            self.stats["seconds_saved"] += max(0.0, job["seconds"] - waited)
+        return text, job["used"]
+
+    def _generate_now(self, chapter):
+        prompt, used = self.make_prompt(chapter)
+        return self.generate(prompt), used
+
+    def summary(self):
+        s = self.stats
+        served = s["hits"] + s["partial_hits"]
+        rate = served / s["requests"] if s["requests"] else 0.0
+        return (f"Prefetch: {served}/{s['requests']} chapters served ahead of time ({rate:.0%}; "
+                f"{s['partial_hits']} still running), ~{s['seconds_saved']:.1f}s saved, {s['cancelled']} cancelled")
+
+    def close(self):
+        with self._lock:
+            for job in self._jobs.values():
+                job["future"].cancel()
+            self._jobs.clear()
+        self._pool.shutdown(wait=False)
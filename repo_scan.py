@@ -0,0 +1,52 @@
+import os
+from typing import List, Dict
+
+# directories we never descend into (vendored deps, VCS metadata, build output)
+IGNORED_DIRS = {
+    ".git", ".hg", ".svn",
+    "node_modules", "bower_components",
+    "venv", ".venv", "env", "__pycache__",
+    ".mypy_cache", ".pytest_cache", ".tox", ".nox",
+    ".next", ".nuxt", "dist", "build", "coverage",
+}
+
+def scan_repository(repo_path: str, ignored_dirs=IGNORED_DIRS) -> List[Dict]:
+    """
+    Walk the repo once with os.scandir, pruning ignored directories.
+    Returns a manifest: one dict per file with path, rel, name, ext, size, mtime.
+    Every analysis stage (tech stack, import scan, boilerplate filter) reads this
+    instead of walking the tree again.
+    """
+    manifest = []
+    stack = [repo_path]
+    while stack:
+        current = stack.pop()
+        try:
+            it = os.scandir(current)
+        except OSError:
+            continue
+        with it:
+            entries = sorted(it, key=lambda e: e.name)
+        subdirs = []
+        for entry in entries:
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    if entry.name not in ignored_dirs:
+                        subdirs.append(entry.path)
+                    continue
+                if not entry.is_file(follow_symlinks=False):
+                    continue
+                st = entry.stat(follow_symlinks=False)
+            except OSError:
+                continue
+            manifest.append({
+                "path": entry.path,
+                "rel": os.path.relpath(entry.path, repo_path).replace(os.sep, "/"),
+                "name": entry.name,
+                "ext": os.path.splitext(entry.name)[1],
+                "size": st.st_size,
+                "mtime": st.st_mtime,
+            })
+        # reversed so the stack pops directories in sorted order
+        stack.extend(reversed(subdirs))
+    return manifest
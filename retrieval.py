@@ -0,0 +1,109 @@
+import math, heapq
+from array import array
+from operator import itemgetter
+
+# BM25 over the token ids index_repository already computes, so a question can pull in
+# the few functions it is about instead of whole chapters.
+# Postings are stored CSR-style in flat arrays indexed by vocab id, and each posting keeps
+# its full BM25 weight (idf and length normalisation are query-independent). A query is
+# then a few slice-and-add passes over contiguous arrays plus a heap for the top k.
+
+K1 = 1.2
+B = 0.75
+
+class BM25Index:
+    def __init__(self, token_id_lists, vocab, boring=(), chapter_of=None, k1=K1, b=B):
+        """
+        token_id_lists: one array('I') of vocab ids per function (index order).
+        vocab: the TokenVocab the ids came from; boring: ids left out of the index.
+        chapter_of: chapter number (0-based) of each function, for chapter ranking.
+        """
+        self.vocab_ids = vocab.ids
+        self.n_docs = len(token_id_lists)
+        self.chapter_of = array("I", chapter_of) if chapter_of is not None else None
+        boring = set(boring)
+        # only identifier/number tokens are searchable; operators never appear in questions
+        searchable = [tid not in boring and tok[:1].isalnum() for tid, tok in enumerate(vocab.tokens)]
+
+        doc_tf = []
+        lengths = array("I")
+        df = array("I", bytes(4 * len(vocab)))
+        for ids in token_id_lists:
+            tf = {}
+            for t in ids:
+                if searchable[t]:
+                    tf[t] = tf.get(t, 0) + 1
+            doc_tf.append(tf)
+            lengths.append(sum(tf.values()))
+            for t in tf:
+                df[t] += 1
+        avgdl = (sum(lengths) / self.n_docs) if self.n_docs else 1.0
+
+        # counting sort into CSR: indptr[t]..indptr[t+1] are the postings of term t
+        indptr = array("I", [0])
+        total = 0
+        for count in df:
+            total += count
+            indptr.append(total)
+        fill = array("I", indptr[:-1])
+        docs = array("I", bytes(4 * total))
+        weights = array("f", bytes(4 * total))
+        n = self.n_docs
+        idf = [math.log(1 + (n - d + 0.5) / (d + 0.5)) if d else 0.0 for d in df]
+        for doc, (tf, dl) in enumerate(zip(doc_tf, lengths)):
+            norm = k1 * (1 - b + b * dl / avgdl) if avgdl else k1
+            for t, f in tf.items():
+                p = fill[t]
+                fill[t] = p + 1
+                docs[p] = doc
+                weights[p] = idf[t] * f * (k1 + 1) / (f + norm)
+        self.indptr, self.docs, self.weights = indptr, docs, weights
+        self.terms = sum(1 for d in df if d)
+
+    def __len__(self):
+        return self.n_docs
+
+    def query_ids(self, text):
+        """Distinct indexed vocab ids in a free-text question."""
+        from chunking import tokenize_function_body
+        ids = self.vocab_ids
+        indptr = self.indptr
+        out = []
+        for tok in dict.fromkeys(tokenize_function_body(text, keep_symbols=False)):
+            tid = ids.get(tok)
+            if tid is not None and indptr[tid + 1] > indptr[tid]:
+                out.append(tid)
+        return out
+
+    def scores(self, text):
+        """{function id: BM25 score} for every function sharing a term with the question."""
+        acc = {}
+        get = acc.get
+        indptr, docs, weights = self.indptr, self.docs, self.weights
+        for tid in self.query_ids(text):
+            lo, hi = indptr[tid], indptr[tid + 1]
+            for doc, w in zip(docs[lo:hi], weights[lo:hi]):
+                acc[doc] = get(doc, 0.0) + w
+        return acc
+
+    def top_functions(self, text, k=10, scores=None):
+        """[(function id, score)] best first."""
+        if scores is None:
+            scores = self.scores(text)
+        return heapq.nlargest(k, scores.items(), key=itemgetter(1))
+
+    def top_chapters(self, text, k=3, scores=None):
+        """[(chapter, score, matching functions)] best first; a chapter scores as its best function."""
+        if self.chapter_of is None:
+            return []
+        if scores is None:
+            scores = self.scores(text)
+        best, hits = {}, {}
+        chapter_of = self.chapter_of
+        for doc, s in scores.items():
+            c = chapter_of[doc]
+            if s > best.get(c, 0.0):
+                best[c] = s
+            hits[c] = hits.get(c, 0) + 1
+        top = heapq.nlargest(k, best.items(), key=itemgetter(1))
+        return [(c, s, hits[c]) for c, s in top]
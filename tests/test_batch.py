@@ -0,0 +1,38 @@
+import subprocess
+
+import pytest
+
+import batch
+
+
+def _bare_repo(root, owner, code):
+    work = root / owner / "work"
+    work.mkdir(parents=True)
+    (work / "app.js").write_text(code)
+    for args in (["init", "-b", "main"], ["add", "app.js"],
+                 ["-c", "user.name=t", "-c", "user.email=t@example.com", "commit", "-m", owner]):
+        subprocess.run(["git", *args], cwd=work, check=True, capture_output=True)
+    bare = root / owner / "api.git"
+    subprocess.run(["git", "clone", "--bare", str(work), str(bare)], check=True, capture_output=True)
+    return f"file://{bare}"
+
+
+def test_checkout_name_tells_same_basenames_apart():
+    a = batch.checkout_name("https://github.com/alice/api")
+    b = batch.checkout_name("https://github.com/bob/api")
+    assert a != b
+    assert a.startswith("api-") and b.startswith("api-")
+    assert batch.checkout_name("https://github.com/alice/api.git/") == a
+
+
+def test_batch_records_for_same_basename_sources_hold_their_own_code(monkeypatch, tmp_path):
+    pytest.importorskip("git")
+    sources = [_bare_repo(tmp_path, "alice", "function alice_handler(x) { return x; }\n"),
+               _bare_repo(tmp_path, "bob", "function bob_handler(x) { return x; }\n")]
+    monkeypatch.chdir(tmp_path)
+    records = {r["source"]: r for r in batch.run_batch(sources, jobs=2, timeout=120, local_only=True)}
+    for source, owner in zip(sources, ("alice", "bob")):
+        record = records[source]
+        assert record["status"] == "ok", record.get("error")
+        names = {f["name"] for ch in record["chapters"] for f in ch["functions"]}
+        assert names == {f"{owner}_handler"}
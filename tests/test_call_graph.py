@@ -0,0 +1,46 @@
+from chunking import _CallResolver, _file_imports, index_repository
+
+
+def _in_degree(index, name):
+    return next(f["in_degree"] for f in index["functions"] if f["name"] == name)
+
+
+def test_file_imports_keys_aliases_by_local_name():
+    js = "import { fetchData as load, other } from './api';\nconst { save: persist } = require('./store');\n"
+    assert _file_imports(js) == {
+        "load": ["./api", "fetchdata"],
+        "other": ["./api", "other"],
+        "persist": ["./store", "save"],
+    }
+    py = "from pkg.api import fetch_data as load, other\n"
+    assert _file_imports(py) == {"load": ["pkg/api", "fetch_data"], "other": ["pkg/api", "other"]}
+
+
+def test_aliased_js_import_links_call_to_original(tmp_path):
+    api = tmp_path / "api.js"
+    api.write_text("export function fetchData(url) {\n  return url;\n}\n")
+    app = tmp_path / "app.js"
+    app.write_text("import { fetchData as load } from './api';\n"
+                   "function main() {\n  return load('/x');\n}\n")
+    index = index_repository([str(api), str(app)])
+    assert _in_degree(index, "fetchData") == 1
+
+
+def test_aliased_python_import_resolves_to_original():
+    funcs = [{"name": "fetch_data", "file": "pkg/api.py"}, {"name": "main", "file": "app.py"}]
+    imports = {"app.py": _file_imports("from pkg.api import fetch_data as load\n")}
+    assert _CallResolver(funcs, imports).resolve("load", "app.py") == [0]
+
+
+def test_file_imports_span_lines():
+    js = "import {\n  fetchData,\n  save as persist,\n} from './api';\nimport './polyfill';\n"
+    assert _file_imports(js) == {"fetchdata": ["./api", "fetchdata"], "persist": ["./api", "save"]}
+    py = "from pkg.api import (\n    fetch_data,  # network\n    save as persist,\n)\n"
+    assert _file_imports(py) == {"fetch_data": ["pkg/api", "fetch_data"], "persist": ["pkg/api", "save"]}
+
+
+def test_multiline_import_resolves_a_common_name():
+    # five files define render(): only the import says which one app.js calls
+    funcs = [{"name": "render", "file": f"views/v{i}.js"} for i in range(5)] + [{"name": "main", "file": "app.js"}]
+    imports = {"app.js": _file_imports("import {\n  render,\n} from './views/v3';\n")}
+    assert _CallResolver(funcs, imports).resolve("render", "app.js") == [3]
@@ -0,0 +1,20 @@
+from chunking import build_adaptive_boring_set, index_repository
+
+
+def test_chapter_titles_are_words(tmp_path):
+    (tmp_path / "a.js").write_text("function f(a) {\n  return g(a + 3, 4, 5);\n}\nfunction g(a) {\n  return (a);\n}\n")
+    titles = [ch["title"] for ch in index_repository([str(tmp_path / "a.js")])["chapters"]]
+    for title in titles:
+        assert all(tok[:1].isalnum() and not tok.isdigit() for tok in title.split()), title
+
+
+def test_token_in_every_function_is_boring():
+    # five tokens tie at the top, more than the 2% cut (two tokens) can hold
+    common = ["return", "x", "if", "const", "arg"]
+    per_function = [common + [f"u{i}", f"v{i}"] for i in range(50)]
+    boring = build_adaptive_boring_set([t for toks in per_function for t in toks], top_quantile=0.02)
+    assert boring == set(common)
+
+
+def test_flat_distribution_has_no_boring_tokens():
+    assert build_adaptive_boring_set(["a", "b", "c", "d"], top_quantile=0.02) == set()
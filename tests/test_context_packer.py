@@ -0,0 +1,33 @@
+import json
+
+from chunking import index_repository
+from context_packer import pack_context
+
+
+def _index(tmp_path):
+    (tmp_path / "cache.js").write_text(
+        "export function evictOldest(cache) {\n  cache.delete(cache.keys().next().value);\n}\n")
+    (tmp_path / "git.js").write_text(
+        "export function cloneRepository(url) {\n  return runGit(url);\n}\n"
+        "function runGit(args) {\n  return args;\n}\n")
+    return index_repository([str(tmp_path / "cache.js"), str(tmp_path / "git.js")])
+
+
+def _chapter_of(index, name):
+    return next(n for n, ch in enumerate(index["chapters"]) if any(f["name"] == name for f in ch["functions"]))
+
+
+def test_question_without_matches_keeps_current_chapter_code(tmp_path):
+    index = _index(tmp_path)
+    chapter = _chapter_of(index, "cloneRepository")
+    payload = json.loads(pack_context(index, chapter=chapter, question="explain this more")[0])
+    assert "relevant" not in payload
+    assert {c["name"] for c in payload["current"]["code"]} >= {"cloneRepository"}
+
+
+def test_question_sends_matches_and_current_chapter(tmp_path):
+    index = _index(tmp_path)
+    chapter = _chapter_of(index, "cloneRepository")
+    payload = json.loads(pack_context(index, chapter=chapter, question="how is the cache evicted")[0])
+    assert [c["name"] for c in payload["relevant"]["code"]] == ["evictOldest"]
+    assert "cloneRepository" in {c["name"] for c in payload["current"]["code"]}
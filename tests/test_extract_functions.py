@@ -0,0 +1,63 @@
+from chunking import extract_functions
+
+
+def _spans(code):
+    return [(f["name"], f["start_line"], f["end_line"]) for f in extract_functions(code)]
+
+
+def test_nested_functions_are_both_extracted():
+    code = ("function outer(a) {\n"
+            "  function inner(b) {\n"
+            "    return b;\n"
+            "  }\n"
+            "  return inner(a);\n"
+            "}\n")
+    assert _spans(code) == [("outer", 1, 6), ("inner", 2, 4)]
+
+
+def test_braces_in_strings_comments_and_templates_are_ignored():
+    code = ("function f() {\n"
+            "  const s = '}'; const t = \"{\"; // } in a comment\n"
+            "  /* { in a block comment */\n"
+            "  return `${s} }`;\n"
+            "}\n"
+            "function g() { return 1; }\n")
+    assert _spans(code) == [("f", 1, 5), ("g", 6, 6)]
+
+
+def test_arrow_functions():
+    code = ("const add = (a, b) => {\n"
+            "  return a + b;\n"
+            "};\n"
+            "const one = async (x) => { return x; };\n")
+    assert _spans(code) == [("add", 1, 3), ("one", 4, 4)]
+
+
+def test_class_methods_without_their_control_flow_blocks():
+    code = ("class A {\n"
+            "  constructor(x) {\n"
+            "    this.x = x;\n"
+            "  }\n"
+            "  get(y) {\n"
+            "    if (y) {\n"
+            "      return y;\n"
+            "    }\n"
+            "    try { f(); } catch (e) { g(); }\n"
+            "  }\n"
+            "}\n")
+    assert _spans(code) == [("constructor", 2, 4), ("get", 5, 10)]
+
+
+def test_control_flow_blocks_are_not_functions():
+    code = ("if (x) {\n  run();\n}\n"
+            "for (let i = 0; i < 3; i++) {\n  step();\n}\n"
+            "try { a(); } catch (err) { b(); }\n"
+            "while (y) { z(); }\n"
+            "switch (k) { case 1: break; }\n")
+    assert _spans(code) == []
+
+
+def test_function_code_is_the_exact_source_text():
+    code = "// header\nfunction f(a) {\n  return a;\n}\n"
+    (f,) = extract_functions(code)
+    assert f["code"] == "function f(a) {\n  return a;\n}"
@@ -0,0 +1,119 @@
+import os
+import subprocess
+
+import pytest
+
+git = pytest.importorskip("git")
+
+from git_sync import sync_repo
+
+
+def _git(cwd, *args):
+    subprocess.run(["git", "-c", "user.name=test", "-c", "user.email=test@example.com", *args],
+                   cwd=cwd, check=True, capture_output=True)
+
+
+def _commit(work, rel, text, message):
+    path = os.path.join(work, rel)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as fh:
+        fh.write(text)
+    _git(work, "add", rel)
+    _git(work, "commit", "-m", message)
+
+
+@pytest.fixture
+def upstream(tmp_path):
+    """(bare repo, working clone that pushes to it) with three commits on main."""
+    work = str(tmp_path / "work")
+    bare = str(tmp_path / "origin.git")
+    os.makedirs(work)
+    _git(work, "init", "-b", "main")
+    _commit(work, "README.md", "readme\n", "first")
+    _commit(work, "src/app.py", "print('app')\n", "add src")
+    _commit(work, "docs/guide.md", "guide\n", "add docs")
+    _git(str(tmp_path), "clone", "--bare", work, bare)
+    _git(work, "remote", "add", "origin", bare)
+    _git(work, "fetch", "origin")
+    _git(work, "branch", "--set-upstream-to=origin/main")
+    return bare, work
+
+
+def _push(work, rel, text, message):
+    _commit(work, rel, text, message)
+    _git(work, "push", "origin", "main")
+
+
+def test_fresh_clone_with_depth(upstream, tmp_path):
+    bare, _ = upstream
+    dest = str(tmp_path / "clone")
+    assert sync_repo(bare, dest, depth=1, echo=lambda msg: None) == "cloned"
+    repo = git.Repo(dest)
+    assert repo.git.rev_parse("--is-shallow-repository") == "true"
+    assert len(list(repo.iter_commits())) == 1
+
+
+def test_fresh_clone_partial(upstream, tmp_path):
+    bare, _ = upstream
+    _git(bare, "config", "uploadpack.allowFilter", "true")
+    dest = str(tmp_path / "clone")
+    assert sync_repo(bare, dest, blob_filter="blob:none", echo=lambda msg: None) == "cloned"
+    repo = git.Repo(dest)
+    assert repo.git.config("remote.origin.partialclonefilter") == "blob:none"
+    assert os.path.isfile(os.path.join(dest, "src", "app.py"))
+
+
+def test_fresh_clone_sparse(upstream, tmp_path):
+    bare, _ = upstream
+    dest = str(tmp_path / "clone")
+    assert sync_repo(bare, dest, sparse_paths=["src"], echo=lambda msg: None) == "cloned"
+    assert os.path.isfile(os.path.join(dest, "src", "app.py"))
+    assert os.path.isfile(os.path.join(dest, "README.md"))
+    assert not os.path.exists(os.path.join(dest, "docs"))
+
+
+def test_update_fast_forwards(upstream, tmp_path):
+    bare, work = upstream
+    dest = str(tmp_path / "clone")
+    sync_repo(bare, dest, depth=1, echo=lambda msg: None)
+    assert sync_repo(bare, dest, echo=lambda msg: None) == "up-to-date"
+    _push(work, "src/app.py", "print('v2')\n", "update app")
+    assert sync_repo(bare, dest, echo=lambda msg: None) == "updated"
+    assert git.Repo(dest).head.commit.hexsha == git.Repo(bare).commit("main").hexsha
+    with open(os.path.join(dest, "src", "app.py"), encoding="utf-8") as fh:
+        assert fh.read() == "print('v2')\n"
+
+
+def test_update_refuses_dirty_tree(upstream, tmp_path):
+    bare, work = upstream
+    dest = str(tmp_path / "clone")
+    sync_repo(bare, dest, echo=lambda msg: None)
+    before = git.Repo(dest).head.commit.hexsha
+    with open(os.path.join(dest, "src", "app.py"), "w", encoding="utf-8") as fh:
+        fh.write("local edit\n")
+    _push(work, "README.md", "readme v2\n", "update readme")
+    assert sync_repo(bare, dest, echo=lambda msg: None) == "local changes, not updated"
+    assert git.Repo(dest).head.commit.hexsha == before
+    with open(os.path.join(dest, "src", "app.py"), encoding="utf-8") as fh:
+        assert fh.read() == "local edit\n"
+
+
+def test_update_refuses_diverged_branch(upstream, tmp_path):
+    bare, work = upstream
+    dest = str(tmp_path / "clone")
+    sync_repo(bare, dest, echo=lambda msg: None)
+    _commit(dest, "local.txt", "mine\n", "local commit")
+    before = git.Repo(dest).head.commit.hexsha
+    _push(work, "README.md", "readme v2\n", "update readme")
+    assert sync_repo(bare, dest, echo=lambda msg: None) == "diverged from upstream, not updated"
+    assert git.Repo(dest).head.commit.hexsha == before
+
+
+def test_existing_checkout_skipped_without_update(upstream, tmp_path):
+    bare, work = upstream
+    dest = str(tmp_path / "clone")
+    sync_repo(bare, dest, echo=lambda msg: None)
+    before = git.Repo(dest).head.commit.hexsha
+    _push(work, "README.md", "readme v2\n", "update readme")
+    assert sync_repo(bare, dest, update=False, echo=lambda msg: None) == "skipped"
+    assert git.Repo(dest).head.commit.hexsha == before
@@ -0,0 +1,103 @@
+import http.client
+import subprocess
+import threading
+
+import pytest
+
+import batch
+import index_server
+import llm_gateway
+import pipeline
+from index_server import ApiError, IndexStore
+
+
+@pytest.fixture
+def store(monkeypatch):
+    monkeypatch.setattr(index_server, "prepare_source", lambda source: (source, "stub"))
+    monkeypatch.setattr(pipeline, "analyze_repo", lambda clone_dir, name, **options: {"results": {
+        "tech_stack": {}, "index": {"summary": {"source": clone_dir}}}})
+    return IndexStore(max_repos=4)
+
+
+@pytest.fixture
+def server():
+    server = index_server.make_server(port=0)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def _status(server, path, method="GET", headers=None, body=None):
+    conn = http.client.HTTPConnection("127.0.0.1", server.server_address[1], timeout=10)
+    try:
+        conn.request(method, path, body=body, headers=headers or {})
+        return conn.getresponse().status
+    finally:
+        conn.close()
+
+
+def test_sources_with_the_same_basename_stay_separate(store):
+    a = store.load("https://github.com/alice/utils")
+    b = store.load("https://github.com/bob/utils")
+    assert a["name"] == b["name"] == "utils"
+    assert a is not b
+    assert store.keys() == ["https://github.com/alice/utils", "https://github.com/bob/utils"]
+    assert store.load("https://github.com/alice/utils.git/") is a
+    assert store.get("https://github.com/bob/utils") is b
+    with pytest.raises(ApiError) as err:
+        store.get("utils")
+    assert err.value.status == 409
+
+
+def test_evict_by_source_or_unique_name(store):
+    store.load("https://github.com/alice/utils")
+    store.load("https://github.com/bob/tools")
+    assert store.evict("https://github.com/alice/utils.git")
+    assert store.evict("tools")
+    assert not store.evict("tools")
+    assert store.keys() == []
+
+
+def test_loading_locks_are_dropped_after_each_load(store):
+    store.load("https://github.com/alice/utils")
+    store.load("https://github.com/alice/utils", refresh=True)
+    assert store._loading == {}
+
+
+def test_ask_is_rejected_in_local_only_mode(monkeypatch, server):
+    monkeypatch.setattr(llm_gateway, "get_backend", lambda: llm_gateway.LocalOnlyBackend())
+    with pytest.raises(RuntimeError, match="disabled in local-only mode"):
+        index_server.request("ask", port=server.server_address[1], source="unused", q="why?")
+
+
+def test_same_basename_sources_get_their_own_checkouts(monkeypatch, tmp_path):
+    pytest.importorskip("git")
+    sources = []
+    for owner in ("alice", "bob"):
+        work = tmp_path / owner / "work"
+        work.mkdir(parents=True)
+        (work / "owner.txt").write_text(owner)
+        for args in (["init", "-b", "main"], ["add", "owner.txt"],
+                     ["-c", "user.name=t", "-c", "user.email=t@example.com", "commit", "-m", owner]):
+            subprocess.run(["git", *args], cwd=work, check=True, capture_output=True)
+        subprocess.run(["git", "clone", "--bare", str(work), str(tmp_path / owner / "utils.git")],
+                       check=True, capture_output=True)
+        sources.append(f"file://{tmp_path / owner / 'utils.git'}")
+
+    monkeypatch.setattr(batch, "CLONE_ROOT", str(tmp_path / "clones"))
+    seen = []
+    monkeypatch.setattr(pipeline, "analyze_repo", lambda clone_dir, name, **options: seen.append(name) or {
+        "results": {"tech_stack": {}, "index": {"owner": open(f"{clone_dir}/owner.txt").read()}}})
+    store = IndexStore()
+    assert [store.load(src)["index"]["owner"] for src in sources] == ["alice", "bob"]
+    assert len(set(seen)) == 2
+
+
+def test_side_effects_need_a_local_json_post(server):
+    assert _status(server, "/health") == 200
+    assert _status(server, "/load?source=https://example.com/x") == 405
+    assert _status(server, "/chapters?source=https://example.com/x") == 405
+    assert _status(server, "/evict", "POST", {"Content-Type": "text/plain"}, '{"repo": "x"}') == 415
+    assert _status(server, "/evict", "POST", {"Content-Type": "application/json"}, '{"repo": "x"}') == 200
+    assert _status(server, "/health", headers={"Host": "attacker.example:8765"}) == 403
@@ -0,0 +1,24 @@
+from chunking import _build_graph, _label_propagation
+
+
+def _graph(n, calls, file_ids):
+    return _build_graph(n, {i * n + j for i, j in calls}, file_ids)
+
+
+def test_call_clusters_become_chapters():
+    # two triangles in separate files, joined by a single call
+    calls = [(0, 1), (1, 2), (2, 0), (3, 4), (4, 5), (5, 3), (2, 3)]
+    comps = _label_propagation(_graph(6, calls, [0, 0, 0, 1, 1, 1]))
+    assert comps == [[0, 1, 2], [3, 4, 5]]
+
+
+def test_chapters_respect_max_size():
+    calls = [(i, i + 1) for i in range(29)]
+    comps = _label_propagation(_graph(30, calls, [0] * 30), max_size=7)
+    assert sorted(i for c in comps for i in c) == list(range(30))
+    assert max(len(c) for c in comps) <= 7
+
+
+def test_large_file_without_calls_splits_into_full_chapters():
+    comps = _label_propagation(_graph(200, [], [0] * 200), max_size=40)
+    assert sorted(len(c) for c in comps) == [40] * 5
@@ -0,0 +1,18 @@
+from prefetch import ChapterPrefetcher
+
+
+def test_hit_returns_stored_token_count_without_rebuilding_the_prompt():
+    built = []
+
+    def make_prompt(chapter):
+        built.append(chapter)
+        return f"explain {chapter}", 100 + chapter
+
+    prefetcher = ChapterPrefetcher(make_prompt, depth=1, generate=lambda prompt: prompt.upper())
+    try:
+        prefetcher.schedule(-1, 3)
+        assert prefetcher.get(0) == ("EXPLAIN 0", 100)
+        assert built == [0]
+        assert prefetcher.get(2) == ("EXPLAIN 2", 102)   # not prefetched: generated now
+    finally:
+        prefetcher.close()
@@ -0,0 +1,29 @@
+from chunking import index_repository, retrieve_file_list
+from Deterministic_Setup import filter_boilerplate_files, is_boilerplate, rank_files
+
+
+def _entry(rel, size=5000):
+    return {"path": "/repo/" + rel, "rel": rel, "ext": "." + rel.rsplit(".", 1)[1], "size": size}
+
+
+def test_generated_and_bundled_files_rank_last():
+    manifest = [_entry(rel) for rel in ("src/generated0.js", "src/vendor.bundle.js", "src/api.gen.ts",
+                                        "src/app.min.js", "src/router.js", "src/bundler.js")]
+    ranked = [e["rel"] for _, e in rank_files(manifest, in_degree={"/repo/src/generated0.js": 50})]
+    assert set(ranked[:2]) == {"src/router.js", "src/bundler.js"}
+
+
+def test_boilerplate_matches_nested_directories():
+    assert is_boilerplate({"rel": "web/node_modules/left-pad/index.js"})
+    assert is_boilerplate({"rel": "tools/venv/lib/site.py"})
+    assert not is_boilerplate({"rel": "src/app.py"})
+
+
+def test_local_only_key_files_keep_bracketed_route_names(tmp_path):
+    (tmp_path / "pages").mkdir()
+    (tmp_path / "pages" / "[id].js").write_text("export function Post(props) {\n  return props.id;\n}\n" * 20)
+    files = filter_boilerplate_files(str(tmp_path), local_only=True)
+    assert [f.endswith("[id].js") for f in files] == [True]
+    assert retrieve_file_list(files) == files
+    assert index_repository(files)["summary"]["functions"] > 0
+    assert retrieve_file_list(repr(files)) == files
@@ -0,0 +1,6 @@
+from Deterministic_Setup import detect_tech_stack
+
+
+def test_react_dom_import_detects_react(tmp_path):
+    (tmp_path / "main.js").write_text("import { createRoot } from 'react-dom/client';\n\nfunction start() {}\n")
+    assert "React" in detect_tech_stack(str(tmp_path))["frameworks"]
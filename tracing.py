@@ -0,0 +1,84 @@
+import os, json, time, threading
+from contextlib import contextmanager
+
+try:
+    import resource      # not available on Windows; RSS is then left out
+except ImportError:
+    resource = None
+
+# Nested spans for `fetch_repo --trace out.json`, written as Chrome trace-event JSON
+# (open in chrome://tracing or https://ui.perfetto.dev). Disabled by default: span()
+# then costs one attribute lookup and records nothing.
+
+_enabled = False
+_events = []
+_lock = threading.Lock()
+_t0 = time.perf_counter()
+
+class _Span:
+    __slots__ = ("args",)
+
+    def __init__(self):
+        self.args = {}
+
+    def set(self, **kwargs):
+        """Attach counters (files, functions, prompt_chars, ...) to the span."""
+        self.args.update(kwargs)
+
+_NULL_SPAN = _Span()
+
+def enable():
+    global _enabled, _t0
+    with _lock:
+        _events.clear()
+    _t0 = time.perf_counter()
+    _enabled = True
+
+def disable():
+    global _enabled
+    _enabled = False
+
+def is_enabled():
+    return _enabled
+
+def _max_rss_kb():
+    if resource is None:
+        return None
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss   # KB on Linux
+
+@contextmanager
+def span(name, cat="stage", **args):
+    if not _enabled:
+        _NULL_SPAN.args.clear()
+        yield _NULL_SPAN
+        return
+    s = _Span()
+    s.args.update(args)
+    rss0 = _max_rss_kb()
+    cpu0 = time.thread_time()
+    t = time.perf_counter()
+    try:
+        yield s
+    finally:
+        wall = time.perf_counter() - t
+        s.args["cpu_ms"] = round((time.thread_time() - cpu0) * 1000, 3)
+        if rss0 is not None:
+            s.args["peak_rss_delta_kb"] = _max_rss_kb() - rss0
+        event = {
+            "name": name, "cat": cat, "ph": "X",
+            "ts": round((t - _t0) * 1e6, 1), "dur": round(wall * 1e6, 1),
+            "pid": os.getpid(), "tid": threading.get_ident(),
+            "args": s.args,
+        }
+        with _lock:
+            _events.append(event)
+
+def events():
+    with _lock:
+        return list(_events)
+
+def write_chrome_trace(path):
+    with _lock:
+        data = {"traceEvents": sorted(_events, key=lambda e: e["ts"]), "displayTimeUnit": "ms"}
+    with open(path, "w", encoding="utf-8") as fh:
+        json.dump(data, fh, indent=1, default=str)